@@ -1,13 +1,25 @@
-import pygame
+# pygame is only imported by draw_board and main, so the board and the solvers can be used (by batch.py, benchmark.py, ...)
+# without loading it, on machines without a display
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import colorsys
+import copy
+import functools
+import heapq
+import multiprocessing
+import os
 import random
+import tempfile
+import threading
 import time
 
 # Constants
 SCREEN_WIDTH = 480
 SCREEN_HEIGHT = 480
-GRID_SIZE = 30
-NUM_ROBOTS = 4
+GRID_SIZE = 30  # pixels of a cell of a 16x16 board in the window (see cell_size for other sizes)
+NUM_ROBOTS = 4  # default number of robots of a random board
+MAX_DISTANCE_MAPS = 64  # distance maps kept in RicochetRobots.distance_maps (the oldest one is removed first)
+CACHE_FILE = 'solutions.db'  # database of the solutions already found by the game (see solution_cache.py)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -17,22 +29,156 @@ RED = (255, 0, 0)
 BLUE = (59,131,189)
 GREEN = (0,255,0)
 YELLOW = (255,255,0)
-
-players_colors = [RED, BLUE, YELLOW, GREEN]
+PURPLE = (128, 0, 128)
+ORANGE = (255, 165, 0)
+CYAN = (0, 255, 255)
+PINK = (255, 105, 180)
+
+players_colors = [RED, BLUE, YELLOW, GREEN, PURPLE, ORANGE, CYAN, PINK]
+
+# color of the robot i: players_colors first, then colors spread over the hues for games with more robots
+def robot_color(i):
+    if i < len(players_colors):
+        return players_colors[i]
+    red, green, blue = colorsys.hsv_to_rgb((i * 0.618033988749895) % 1, 0.8, 0.9)
+    return (int(red * 255), int(green * 255), int(blue * 255))
+
+# index i of robot_color(i) == color (for the first 256 colors, which is what the level files can store)
+def color_index(color):
+    for i in range(256):
+        if robot_color(i) == tuple(color):
+            return i
+    raise ValueError("%r is not a robot color" % (color,))
+
+# Directions in which a robot can be moved
+DIRECTIONS = ['up', 'down', 'left', 'right']
+# (row, column) step of each direction
+DIRECTION_DELTAS = {'up': (-1, 0), 'down': (1, 0), 'left': (0, -1), 'right': (0, 1)}
+OPPOSITE = {'up': 'down', 'down': 'up', 'left': 'right', 'right': 'left'}
+# bits of RicochetRobots.cell_walls: a wall on a side of a cell (a robot can not leave the cell through it) and BLOCKED for
+# a cell that is a wall itself (its neighbours then have a wall on the side next to it, so no robot can enter it)
+WALL_BITS = {'up': 1, 'down': 2, 'left': 4, 'right': 8}
+BLOCKED = 16
+
+# number of expanded states between two results of the solving generators (iter_bfs, ...)
+SLICE_SIZE = 1000
+# number of expanded states between two checks of the cancel token of a search
+CHECK_EVERY = 1000
+TIME_BUDGET = 300  # seconds given to the AI of main to solve the board
+# states kept in memory by external_bfs before they are sorted and written to disk as a run
+EXTERNAL_BUFFER = 1 << 20
+# bytes read at once from the state files of external_bfs
+READ_BLOCK = 1 << 16
+
+# names of the RicochetRobots methods that solve a board (used by batch.py and benchmark.py, add new solvers here)
+SOLVERS = ['dfs', 'bfs', 'bidirectional_bfs', 'A_star', 'greedy_best_first_search', 'multi_robot_bfs', 'ida_star', 'numpy_bfs',
+           'external_bfs']
+
+# counters of the last search of a solver, kept in RicochetRobots.stats
+class SearchStats:
+    def __init__(self):
+        self.nodes_generated = 0  # states produced by moving a robot (the number printed as "States generated")
+        self.nodes_expanded = 0  # states whose moves have been generated
+        self.duplicate_hits = 0  # generated states that had already been found, so they were dropped
+        self.peak_frontier = 0  # largest size of the queue / open list (of the recursion stack for ida_star)
+        self.max_depth = 0  # largest number of moves from the start of a state taken from the queue / open list
+        self.search_time = 0.0  # seconds taken by the search (up to now when given to a progress callback)
+        self.movegen_time = None  # seconds spent computing the moves, only measured when RicochetRobots.profile is True
+        self.bookkeeping_time = None  # the rest of the time (queues, visited states, ...), also only when profiling
+        self.start_time = time.perf_counter()
+
+    def as_dict(self):
+        counters = dict(vars(self))
+        del counters['start_time']
+        return counters
+
+# cooperative cancellation of a search: the solvers check it every CHECK_EVERY expanded states and raise SearchCancelled
+# once cancel() has been called (from any thread) or the deadline (a time.monotonic() value, None for none) has passed
+class CancelToken:
+    def __init__(self, deadline=None):
+        self.cancelled = False
+        self.deadline = deadline
+
+    def cancel(self):
+        self.cancelled = True
+
+    def should_stop(self):
+        return self.cancelled or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+class SearchCancelled(Exception):
+    pass
+
+# what the solving generators (iter_bfs, iter_dfs, ...) yield after every slice of the search and at its end
+class SearchProgress:
+    def __init__(self, stats, path=None, done=False):
+        self.stats = stats  # SearchStats of the search up to now
+        self.path = path  # best solution found up to now (None while there is none)
+        self.done = done  # True when the search is over, path is then its result (None if the board has no solution)
+
+# decorator of the solvers: when the board has a solution cache (see solution_cache.py), the result is looked up in it before
+# searching and stored in it after searching. Boards without a solution are cached too
+def cached_solver(solver):
+    @functools.wraps(solver)
+    def solve(self, *args, **kwargs):
+        if self.solution_cache is None or args or kwargs:
+            return solver(self, *args, **kwargs)
+        found, path = self.solution_cache.lookup(self, solver.__name__)
+        if found:
+            self.stats = SearchStats()
+            path = None if path is None else list(path)
+        else:
+            path = solver(self)
+            self.solution_cache.store(self, solver.__name__, path)
+        if path and len(path[0]) == 3:
+            self.move_along(path)  # the robots are where the search left them, whether the path was cached or not
+        return path
+    return solve
+
+# write states (packed ints, sorted) to the file path, width bytes each in big endian so the bytes of the file are sorted too
+def write_states(path, states, width):
+    with open(path, 'wb') as f:
+        f.write(b''.join(state.to_bytes(width, 'big') for state in states))
+
+# the states of a file of write_states, read READ_BLOCK bytes at a time
+def read_states(path, width):
+    block = READ_BLOCK - READ_BLOCK % width
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                return
+            for i in range(0, len(data), width):
+                yield int.from_bytes(data[i:i + width], 'big')
 
 class RicochetRobots:
-    def __init__(self, size=16):
+    def __init__(self, size=16, seed=None, num_robots=NUM_ROBOTS):
         self.size = size # size of the board (size x size)
-        self.board = [[' ' for _ in range(size)] for _ in range(size)]  # the cells of the board are ' ' at first
+        self.num_robots = num_robots  # number of robots of place_robots_random
+        self.rng = random.Random(seed)  # random generator of the place_*_random functions (give a seed to get the same board again)
         self.robots = {}  # dict to keep track of only the positions of the robots
         self.colored_robots = {}  # dict to keep track of the positions and colors of the robots
         self.target = None  # cell of the target
-        self.walls = set()  # cells of the walls
+        self.walls = set()  # cells of the walls (the BLOCKED cells of cell_walls)
+        self.cell_walls = self.border_walls()  # walls of every cell x * size + y (WALL_BITS and BLOCKED), see add_walls
         self.game_over = False   # True if the game is over
         self.target_color = None  # color of the target
         self.selected_robot = None  # when moving the robot by ourselves, this says which robot has been selected
         self.initial_positions = {}  # intial positions of the robots
         self.already_visited = [[]]  # dict with the positions already visited of the robots
+        self.stop_table = None  # for each direction, the cell where a robot stops from every cell of the static board (see build_stop_table)
+        self.stats = SearchStats()  # counters of the last search
+        self.verbose = True  # False to stop the solvers from printing their number of states (batch.py, benchmark.py, ...)
+        self.profile = False  # True to measure the time of the move generation in self.stats (slows the searches down)
+        self.progress_callback = None  # function called with self.stats every progress_every expanded states of a search
+        self.progress_every = 10000
+        self.next_callback = 0  # number of expanded states of the next call to progress_callback
+        self.cancel_token = None  # CancelToken checked by the solvers (see BackgroundSolve)
+        self.solution_cache = None  # SolutionCache consulted by the solvers (see cached_solver)
+        self.distance_maps = {}  # (target, cells of the blocking robots) -> moves to the target from every cell (see target_distances)
+        self.reachable_maps = {}  # cells of the robots -> cells where a robot can ever stop (see prove_unsolvable)
+        self.background = None  # pygame Surface with the grid, the walls and the target (see draw_board)
+        self.drawn_robots = None  # robots (x, y, color) drawn on the screen by the last call to draw_board
+        self.robot_rects = []  # rectangles of the screen covered by those robots
         # Difference between self.robot, self.colored_robots, self.initial_robots and self.already_robot: 
         # self.robots: This attribute keeps track of the current positions of all robots at any given time during the game. It is updated whenever a robot moves.
         # self.colored_robots: Unlike self.robots, this attribute is mainly used for visualization purposes. It keeps track of the positions of robots only under specific conditions:
@@ -41,12 +187,97 @@ class RicochetRobots:
         # self.initial_position: This attribute stores the initial positions of all robots at the start of the game. It is not updated during the game unless a random robot change occurs due to no path being found. 
         # self.already_visited: This attribute keeps track of all possible combinations of robot positions that have been explored during the search for a path using BFS. Each combination is recorded once it's explored to avoid revisiting the same position configurations. This helps prevent the algorithm from getting stuck in loops or redundant searches.
 
-    # function to place walls randomly in the board (change number_of_walls to put more or less walls)
+    # cell_walls of an empty board: only the edges of the board have walls
+    def border_walls(self):
+        size = self.size
+        cell_walls = bytearray(size * size)
+        for i in range(size):
+            cell_walls[i] |= WALL_BITS['up']
+            cell_walls[(size - 1) * size + i] |= WALL_BITS['down']
+            cell_walls[i * size] |= WALL_BITS['left']
+            cell_walls[i * size + size - 1] |= WALL_BITS['right']
+        return cell_walls
+
+    # must be called after changing the walls: the stop table and the drawing of the board are built again when needed
+    def walls_changed(self):
+        self.stop_table = None
+        self.distance_maps = {}
+        self.reachable_maps = {}
+        self.background = None
+
+    # must be called after changing self.target or self.target_color, so the board is drawn again
+    def target_changed(self):
+        self.background = None
+
+    # add the cells of cells (pairs (x, y)) to the walls
+    def add_walls(self, cells):
+        size = self.size
+        for x, y in cells:
+            self.walls.add((x, y))
+            self.cell_walls[x * size + y] |= BLOCKED
+            for direction, (dx, dy) in DIRECTION_DELTAS.items():
+                if 0 <= x + dx < size and 0 <= y + dy < size:
+                    self.cell_walls[(x + dx) * size + y + dy] |= WALL_BITS[OPPOSITE[direction]]
+        self.walls_changed()
+
+    # add walls between two cells, like on the real board. edges is a list of (x, y, direction): the wall is on that side of
+    # the cell (x, y), so it stops the robots going through it both ways
+    def add_edge_walls(self, edges):
+        size = self.size
+        for x, y, direction in edges:
+            self.cell_walls[x * size + y] |= WALL_BITS[direction]
+            dx, dy = DIRECTION_DELTAS[direction]
+            if 0 <= x + dx < size and 0 <= y + dy < size:
+                self.cell_walls[(x + dx) * size + y + dy] |= WALL_BITS[OPPOSITE[direction]]
+        self.walls_changed()
+
+    # walls added by add_edge_walls, as (x, y, direction) on the 'down' or 'right' side of a cell. The edges of the board and
+    # the sides of the wall cells are left out
+    def edge_walls(self):
+        size = self.size
+        edges = []
+        for cell in range(size * size):
+            x, y = divmod(cell, size)
+            for direction, neighbour in (('down', cell + size), ('right', cell + 1)):
+                if not self.cell_walls[cell] & WALL_BITS[direction]:
+                    continue
+                if (direction == 'down' and x == size - 1) or (direction == 'right' and y == size - 1):
+                    continue
+                if (self.cell_walls[cell] | self.cell_walls[neighbour]) & BLOCKED:
+                    continue
+                edges.append((x, y, direction))
+        return edges
+
+    # replace the walls of the board with cell_walls (size * size bytes, see WALL_BITS), e.g. read from a level file
+    def set_cell_walls(self, cell_walls):
+        if len(cell_walls) != self.size * self.size:
+            raise ValueError("%d bytes of walls for a %dx%d board" % (len(cell_walls), self.size, self.size))
+        self.cell_walls = bytearray(cell_walls)
+        self.walls = {divmod(cell, self.size) for cell in range(self.size * self.size) if self.cell_walls[cell] & BLOCKED}
+        self.walls_changed()
+
+    # put the target on cell (x, y) with the given color
+    def place_target(self, cell, color):
+        self.target = tuple(cell)
+        self.target_color = tuple(color)
+        self.target_changed()
+
+    # place the robots given as a list of (x, y, color): robots[i] is the robot i
+    def place_robots(self, robots):
+        for i, (x, y, color) in enumerate(robots):
+            self.robots[i] = (x, y)
+            self.colored_robots[i] = (x, y, tuple(color))
+            self.initial_positions[i] = (x, y, tuple(color))
+            self.already_visited[0].append((x, y, tuple(color)))
+
+    # function to place walls randomly in the board (change number_of_walls to put more or less walls, it is for a 16x16
+    # board and grows with the number of cells)
     def place_walls_random(self):
-        number_of_walls = 50
+        number_of_walls = 50 * self.size * self.size // 256
+        cells = []
         for _ in range(number_of_walls):
-            x, y = random.randint(0, self.size - 1), random.randint(0, self.size - 1)
-            self.walls.add((x, y)) 
+            cells.append((self.rng.randint(0, self.size - 1), self.rng.randint(0, self.size - 1)))
+        self.add_walls(cells)
 
     def place_walls_1(self):
         # LEVEL 1
@@ -54,8 +285,7 @@ class RicochetRobots:
                         (5,6), (5,7), (5,13), (5,15), (6,13), (6,10), (0,7), (1,7), (6,7), (7,7), (10,7), (3,8), (11,8),
                         (8,9), (12,8), (13,8), (1,9), (12,9), (13,9), (3,10), (5,10), (10,10), (15,10), (0,10), (0,15),
                         (1,14), (0,13), (2,12), (2,13), (3,12), (6,15), (4,13), (6,6), (10,5), (9,12), (14,11), (13,15),(14,14)]
-        for i in mylist:
-            self.walls.add(i)
+        self.add_walls(mylist)
 
     def place_walls_2(self):  
         # LEVEL 2
@@ -66,8 +296,7 @@ class RicochetRobots:
                     (13, 7), (1, 11), (0, 13), (7, 0), (1, 8), (15, 1), (13, 13), (7, 12), 
                     (3, 5), (5, 2), (9, 0), (10, 4), (9, 12), (11, 9), (10, 13), (7, 11), 
                     (1, 10), (13, 12), (6, 6), (7, 5), (15, 12)]
-        for i in walls_list:
-            self.walls.add(i)
+        self.add_walls(walls_list)
 
     def place_walls_3(self):
         ### LEVEL 3 - Does not contain a valid solution
@@ -76,187 +305,275 @@ class RicochetRobots:
             (3, 15), (5, 12), (8, 8), (2, 4), (13, 4), (9, 13), (10, 8), (13, 1), (15, 4),
             (0, 13), (2, 10), (15, 7), (7, 6), (12, 11), (14, 5), (3, 11), (3, 14), (4, 13), 
             (1, 1), (9, 12), (13, 0), (9, 15), (8, 13), (2, 3), (15, 0), (15, 9), (6, 9)]
-        for i in walls_list:
-            self.walls.add(i)
+        self.add_walls(walls_list)
 
     def place_walls_4(self):
             # LEVEL 4
             mylist = [(4,0), (0,3),(1,4), (3,7), (7,6), (6,9),(11,8),(10,10),(14,9),(13,15),(14,14),
                       (8,0),(12,0),(15,3),(15,6), (15,8),(14,0)]
-            for i in mylist:
-                self.walls.add(i)
+            self.add_walls(mylist)
         
     # function to place the target (this function first put a target in a random cell, and then it creates to walls next to it, so that
     # both walls form a corner and it is easier to find a solution )
     def place_target_random(self):
-        x, y = random.randint(1, self.size - 2), random.randint(1, self.size - 2)
+        x, y = self.rng.randint(1, self.size - 2), self.rng.randint(1, self.size - 2)
         # Randomly choose whether the first wall will be vertical or horizontal
-        is_vertical = random.choice([True, False])
+        is_vertical = self.rng.choice([True, False])
         if is_vertical:
             # If the first wall is vertical, place it to the left or right of the goal
             wall_x = x
-            wall_y = random.choice([y - 1, y + 1])
+            wall_y = self.rng.choice([y - 1, y + 1])
         else:
             # If the first wall is horizontal, place it above or below the goal
-            wall_x = random.choice([x - 1, x + 1])
+            wall_x = self.rng.choice([x - 1, x + 1])
             wall_y = y
 
         # Add the first wall
-        self.walls.add((wall_x, wall_y))
+        self.add_walls([(wall_x, wall_y)])
 
         # Calculate the position of the second wall (forming a corner with the first wall)
         if is_vertical:
             # If the first wall is vertical, the second wall will be above or below the goal
-            wall_x2 = random.choice([x - 1, x + 1])
+            wall_x2 = self.rng.choice([x - 1, x + 1])
             wall_y2 = y
         else:
             # If the first wall is horizontal, the second wall will be to the left or right of the goal
             wall_x2 = x
-            wall_y2 = random.choice([y - 1, y + 1])
+            wall_y2 = self.rng.choice([y - 1, y + 1])
 
         # Add the second wall
-        self.walls.add((wall_x2, wall_y2))
+        self.add_walls([(wall_x2, wall_y2)])
         self.target = (x, y)
-        self.target_color = random.choice(players_colors)
+        self.target_color = self.rng.choice([robot_color(i) for i in range(self.num_robots)])
+        self.target_changed()
     
     def place_target_1(self):
         ### LEVEL 1 ###
-        self.target = (13,14)
-        self.target_color = (255,0,0)
+        self.place_target((13,14), RED)
 
     def place_target_2(self):
         ### LEVEL 2 ###
-        self.target = (4,1)
-        self.target_color = (255,255,0) 
+        self.place_target((4,1), YELLOW)
 
     def place_target_3(self):
         ### LEVEL 3 (non working) ###
-        self.target = (10,3)
-        self.target_color = (0,255,0)
+        self.place_target((10,3), GREEN)
 
     def place_target_4(self):
         ### LEVEL 4 ###
-        self.target = (13,14)
-        self.target_color = (255,0,0)
+        self.place_target((13,14), RED)
 
 
     # function to place robots randomly in the board
     def place_robots_random(self):
-        for i in range(NUM_ROBOTS):
-            x, y = random.randint(0, self.size-1), random.randint(0, self.size-1)
-            while (x, y) in self.robots.values() or (x, y) in self.walls or (x, y) == self.target:
-                x, y = random.randint(0, self.size-1), random.randint(0, self.size-1)
-            self.robots[i] = (x, y)
-            self.colored_robots[i] = (x, y, players_colors[i])
-            self.initial_positions[i] = (x,y,players_colors[i])
-            self.already_visited[0].append((x,y,players_colors[i]))
+        robots = []
+        for i in range(self.num_robots):
+            x, y = self.rng.randint(0, self.size-1), self.rng.randint(0, self.size-1)
+            while (x, y) in [robot[:2] for robot in robots] or (x, y) in self.walls or (x, y) == self.target:
+                x, y = self.rng.randint(0, self.size-1), self.rng.randint(0, self.size-1)
+            robots.append((x, y, robot_color(i)))
+        self.place_robots(robots)
+
+    # remove the walls, the target and the robots, to build another board on the same game
+    def clear_board(self):
+        self.walls = set()
+        self.cell_walls = self.border_walls()
+        self.walls_changed()
+        self.target = None
+        self.target_color = None
+        self.target_changed()
+        self.robots = {}
+        self.colored_robots = {}
+        self.initial_positions = {}
+        self.already_visited = [[]]
+        self.game_over = False
+
+    # build a random board (walls, target and robots, drawn with self.rng like the place_*_random functions) that has a
+    # solution of min_moves to max_moves moves (no maximum if None). The board is built backward from the target: once the
+    # walls, the target and the other robots are placed, target_distances gives the number of moves to the target from every
+    # cell, and the robot with the target color is put on a random cell whose distance is in the range. With exact, that cell
+    # must also have the same lower bound in lower_bound_distances, so moving the other robots can not give a shorter
+    # solution and the number of moves is the optimal one for every solver (else it is the optimal one when only the robot
+    # with the target color moves, as in bfs and A_star). Boards are drawn again until one fits, at most max_attempts times
+    # (ValueError after that). Returns the number of moves
+    def place_solvable_random(self, min_moves=1, max_moves=None, exact=True, max_attempts=1000):
+        size = self.size
+        min_moves = max(min_moves, 1)
+        for _ in range(max_attempts):
+            self.clear_board()
+            self.place_walls_random()
+            self.place_target_random()
+            target_robot = color_index(self.target_color)
+            robots = []
+            for i in range(self.num_robots):
+                if i == target_robot:
+                    robots.append(None)  # placed last, on a cell chosen from the distances
+                    continue
+                x, y = self.rng.randint(0, size - 1), self.rng.randint(0, size - 1)
+                while (x, y) in [robot[:2] for robot in robots if robot] or (x, y) in self.walls or (x, y) == self.target:
+                    x, y = self.rng.randint(0, size - 1), self.rng.randint(0, size - 1)
+                robots.append((x, y, robot_color(i)))
+            occupied = [x * size + y for x, y, _ in filter(None, robots)]
+
+            distances = self.target_distances(occupied)
+            candidates = [cell for cell, moves in enumerate(distances)
+                          if moves is not None and min_moves <= moves and (max_moves is None or moves <= max_moves)
+                          and cell not in occupied]
+            if candidates and exact:
+                lower_bounds = self.lower_bound_distances()
+                candidates = [cell for cell in candidates if lower_bounds[cell] == distances[cell]]
+            if candidates:
+                cell = self.rng.choice(candidates)
+                robots[target_robot] = divmod(cell, size) + (self.target_color,)
+                self.place_robots(robots)
+                return distances[cell]
+        raise ValueError("no board with a solution of %s to %s moves in %d attempts" % (min_moves, max_moves, max_attempts))
 
     def place_robots_1(self):
         ### LEVEL 1
-        self.robots[0] = (6,3)
-        self.robots[1] = (15,2)
-        self.robots[2] = (9,2)
-        self.robots[3] = (0,0)
-        self.colored_robots[0] = (6,3,(255,0,0))
-        self.colored_robots[1] = (15,2,(255,255,0))
-        self.colored_robots[2] = (9,2,(0,255,0))
-        self.colored_robots[3] = (0,0,(59,131,189))
-        self.initial_positions[0] = (6,3,(255,0,0))
-        self.initial_positions[1] = (15,2,(255,255,0))
-        self.initial_positions[2] = (9,2,(0,255,0))
-        self.initial_positions[3] = (0,0,(59,131,189))
-        self.already_visited[0].append((6,3,(255,0,0)))
+        self.place_robots([(6,3,RED), (15,2,YELLOW), (9,2,GREEN), (0,0,BLUE)])
         
     def place_robots_2(self):
         ### LEVEL 2
-        self.robots[0] = (15,0)
-        self.robots[1] = (14,4)
-        self.robots[2] = (1,1)
-        self.robots[3] = (9,9)
-        self.colored_robots[0] = (15,0,(255,255,0))
-        self.colored_robots[1] = (14,4,(255,0,0))
-        self.colored_robots[2] = (1,1,(0,255,0))
-        self.colored_robots[3] = (9,9,(59,131,189))
-        self.initial_positions[0] = (14,4,(255,0,0))
-        self.initial_positions[1] = (15,0,(255,255,0))
-        self.initial_positions[2] = (1,1,(0,255,0))
-        self.initial_positions[3] = (9,9,(59,131,189))
-        self.already_visited[0].append((15,0,(255,255,0)))
+        self.place_robots([(14,4,RED), (15,0,YELLOW), (1,1,GREEN), (9,9,BLUE)])
       
     def place_robots_3(self):
         ### LEVEL 3 - Does not contain a valid solution
-        self.robots[0] = (8, 4)
-        self.robots[1] = (3, 1)
-        self.robots[2] = (11, 11)
-        self.robots[3] = (7, 2)
-        self.colored_robots[0] = (8, 4, (255, 0, 0))
-        self.colored_robots[1] = (3, 1, (59, 131, 189))
-        self.colored_robots[2] = (11, 11, (255, 255, 0))
-        self.colored_robots[3] = (7, 2, (0, 255, 0))
-        self.initial_positions[0] = (8, 4, (255, 0, 0))
-        self.initial_positions[1] = (3, 1, (59, 131, 189))
-        self.initial_positions[2] = (11, 11, (255, 255, 0))
-        self.initial_positions[3] = (7, 2, (0, 255, 0))
-        self.already_visited[0].append((8, 4, (255, 0, 0)))
+        self.place_robots([(8,4,RED), (3,1,BLUE), (11,11,YELLOW), (7,2,GREEN)])
   
     def place_robots_4(self):
             ### LEVEL 4
-            self.robots[0] = (0,0)
-            self.robots[1] = (15,2)
-            self.robots[2] = (9,2)
-            self.robots[3] = (6,4)
-            self.colored_robots[0] = (0,0,(255,0,0))
-            self.colored_robots[1] = (15,2,(255,255,0))
-            self.colored_robots[2] = (9,2,(0,255,0))
-            self.colored_robots[3] = (6,4,(59,131,189))
-            self.initial_positions[0] = (0,0,(255,0,0))
-            self.initial_positions[1] = (15,2,(255,255,0))
-            self.initial_positions[2] = (9,2,(0,255,0))
-            self.initial_positions[3] = (6,4,(59,131,189))
-            self.already_visited[0].append((0,0,(255,0,0)))
-
-
-
-
-
-
-
-    # draw the board - function used by AI and User
-    def draw_board(self, screen):
-        for i in range(self.size):
-            for j in range(self.size):
-                pygame.draw.rect(screen, WHITE, (j * GRID_SIZE, i * GRID_SIZE, GRID_SIZE, GRID_SIZE), 1)
-                for _, (robot_x, robot_y, color) in self.colored_robots.items():
-                    if (i, j) == (robot_x, robot_y):
-                        pygame.draw.circle(screen, color, (j * GRID_SIZE + GRID_SIZE // 2, i * GRID_SIZE + GRID_SIZE // 2), GRID_SIZE // 3)
-                if (i, j) == self.target:
-                    pygame.draw.rect(screen, self.target_color, (j * GRID_SIZE, i * GRID_SIZE, GRID_SIZE, GRID_SIZE), 0)
-                elif (i, j) in self.walls:
-                    pygame.draw.rect(screen, GRAY, (j * GRID_SIZE, i * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-    # check if there is a colision with 2 different robots - function used by AI and User
-    def check_collision(self, position, robot):
-        for robot_id, pos in self.robots.items():
-            if pos == position and robot_id != robot:
-                return True
-        return False
-    
+            self.place_robots([(0,0,RED), (15,2,YELLOW), (9,2,GREEN), (6,4,BLUE)])
+
+
+
+
+
+
+
+    # draw the board - function used by AI and User. The grid, the walls and the target are drawn only once on self.background
+    # (until walls_changed or target_changed is called). Then every call only puts the background back under the robots of the
+    # previous call and draws the robots again, if they moved. It returns the rectangles of the screen that have changed, to be
+    # given to pygame.display.update. With full=True the whole background is drawn again (and the whole screen is returned)
+    def draw_board(self, screen, full=False):
+        import pygame
+        grid = self.cell_size(screen)
+        if self.background is None or self.background.get_size() != screen.get_size():
+            self.background = pygame.Surface(screen.get_size())
+            self.background.fill(WHITE)
+            for i in range(self.size):
+                for j in range(self.size):
+                    pygame.draw.rect(self.background, WHITE, (j * grid, i * grid, grid, grid), 1)
+            for i, j in self.walls:
+                pygame.draw.rect(self.background, GRAY, (j * grid, i * grid, grid, grid))
+            for i, j, direction in self.edge_walls():
+                if direction == 'down':
+                    start, end = (j * grid, (i + 1) * grid), ((j + 1) * grid, (i + 1) * grid)
+                else:
+                    start, end = ((j + 1) * grid, i * grid), ((j + 1) * grid, (i + 1) * grid)
+                pygame.draw.line(self.background, GRAY, start, end, max(1, grid // 8))
+            if self.target is not None:
+                i, j = self.target
+                pygame.draw.rect(self.background, self.target_color, (j * grid, i * grid, grid, grid), 0)
+            full = True
+
+        robots = list(self.colored_robots.values())
+        if full:
+            screen.blit(self.background, (0, 0))
+            dirty_rects = [screen.get_rect()]
+        elif robots == self.drawn_robots:
+            return []
+        else:
+            dirty_rects = self.robot_rects
+            for rect in self.robot_rects:
+                screen.blit(self.background, rect, rect)
+
+        self.robot_rects = []
+        for robot_x, robot_y, color in robots:
+            rect = pygame.Rect(robot_y * grid, robot_x * grid, grid, grid)
+            pygame.draw.circle(screen, color, rect.center, max(1, grid // 3))
+            self.robot_rects.append(rect)
+        self.drawn_robots = robots
+        return dirty_rects + self.robot_rects
+
+    # pixels of a cell when the board is drawn on screen: the whole board fits in the window (GRID_SIZE for a 16x16 board in
+    # the default window)
+    def cell_size(self, screen):
+        return max(1, min(screen.get_width(), screen.get_height()) // self.size)
+
+    # precompute, for every cell of the board and every direction, the cell where a robot stops when only the walls of
+    # cell_walls (which include the edges of the board) are taken into account. It is built once after the walls and the target are placed (the place_walls_*
+    # functions reset it) and then the robots are handled by slide, so moving a robot does not walk the board cell by cell
+    def build_stop_table(self):
+        size = self.size
+        self.stop_table = {}
+        cell_walls = self.cell_walls
+        for direction in DIRECTIONS:
+            dx, dy = DIRECTION_DELTAS[direction]
+            step = dx * size + dy
+            wall = WALL_BITS[direction]
+            stops = [0] * (size * size)
+            # go through the cells starting from the side the robot slides to, so the stop of the next cell is already known
+            rows = range(size) if dx <= 0 else range(size - 1, -1, -1)
+            columns = range(size) if dy <= 0 else range(size - 1, -1, -1)
+            for x in rows:
+                for y in columns:
+                    cell = x * size + y
+                    stops[cell] = cell if cell_walls[cell] & wall else stops[cell + step]
+            self.stop_table[direction] = stops
+        return self.stop_table
+
+    # cell (x * size + y) where a robot starting at cell stops when moving in direction. occupied are the cells of the other
+    # robots: the stop of the static board is only shortened by the robots standing between the start and that stop
+    def slide(self, cell, direction, occupied):
+        if self.stop_table is None:
+            self.build_stop_table()
+        size = self.size
+        stop = self.stop_table[direction][cell]
+        if direction == 'up':
+            for other in occupied:
+                if stop <= other < cell and (cell - other) % size == 0:
+                    stop = other + size
+        elif direction == 'down':
+            for other in occupied:
+                if cell < other <= stop and (other - cell) % size == 0:
+                    stop = other - size
+        elif direction == 'left':
+            for other in occupied:
+                if stop <= other < cell:
+                    stop = other + 1
+        elif direction == 'right':
+            for other in occupied:
+                if cell < other <= stop:
+                    stop = other - 1
+        return stop
+
+    # reverse of slide: the cells from which a robot moving in direction stops on cell when the other robots are on the cells
+    # of occupied (a set). There are none when neither a wall nor a robot stops it on cell
+    def slide_sources(self, cell, direction, occupied):
+        dx, dy = DIRECTION_DELTAS[direction]
+        step = dx * self.size + dy
+        cell_walls = self.cell_walls
+        if not cell_walls[cell] & WALL_BITS[direction] and cell + step not in occupied:
+            return []
+        back = WALL_BITS[OPPOSITE[direction]]
+        sources = []
+        previous = cell
+        while not cell_walls[previous] & back and previous - step not in occupied:
+            previous -= step
+            sources.append(previous)
+        return sources
+
+    # cells of all the robots except robot (positions can be self.robots or self.initial_positions)
+    def other_robot_cells(self, robot, positions):
+        return [pos[0] * self.size + pos[1] for robot_id, pos in positions.items() if robot_id != robot]
+
     # function to move robots when the User is playing the game
     def move_robot(self, direction):
         if not self.game_over and self.selected_robot is not None:
             x, y = self.robots[self.selected_robot]
-            if direction == 'up':
-                while x > 0 and (x-1, y) not in self.walls and not self.check_collision(self.selected_robot, (x - 1, y)):
-                    x -= 1
-            elif direction == 'down':
-                while x < self.size -1 and (x + 1, y) not in self.walls and not self.check_collision(self.selected_robot, (x + 1, y)):
-                    x += 1
-            elif direction == 'left':
-                while y > 0 and (x, y - 1) not in self.walls and not self.check_collision(self.selected_robot, (x, y - 1)):
-                    y -= 1
-            elif direction == 'right':
-                while y < self.size - 1 and (x, y + 1) not in self.walls and not self.check_collision(self.selected_robot, (x, y + 1)):
-                    y += 1
+            occupied = self.other_robot_cells(self.selected_robot, self.robots)
+            x, y = divmod(self.slide(x * self.size + y, direction, occupied), self.size)
             self.robots[self.selected_robot] = (x, y)
             color = self.colored_robots[self.selected_robot][2]
             self.colored_robots[self.selected_robot] = (x, y, color)
@@ -264,58 +581,765 @@ class RicochetRobots:
             if (x, y) == self.target and color == self.target_color:
                 self.game_over = True
     
+    # move the robots of colored_robots (the ones draw_board shows) along the (robot_id, direction, new_pos) moves of path,
+    # as they are at the end of a search of the joint solvers
+    def move_along(self, path):
+        for robot_id, _, (x, y) in path:
+            self.colored_robots[robot_id] = (x, y, self.colored_robots[robot_id][2])
+
     # function used by our AI to move the robot
     def move_in_direction(self, start_pos, direction, current_robot):
         # Move from start_pos in the specified direction until an obstacle is hit
         x, y = start_pos
-        if direction == 'up':
-            while x > 0 and (x-1, y) not in self.walls and (x-1, y) not in self.robots.values():
-                x -= 1
-        elif direction == 'down':
-            while x < self.size-1 and (x+1, y) not in self.walls and (x+1, y) not in self.robots.values():
-                x += 1
-        elif direction == 'left':
-            while y > 0 and (x, y-1) not in self.walls and (x, y-1) not in self.robots.values():
-                y -= 1
-        elif direction == 'right':
-            while y < self.size-1 and (x, y+1) not in self.walls and (x, y+1) not in self.robots.values():
-                y += 1
+        occupied = self.other_robot_cells(current_robot, self.robots)
+        x, y = divmod(self.slide(x * self.size + y, direction, occupied), self.size)
         self.robots[current_robot] = (x,y)
         return (x, y)
 
+    # new counters for a search starting now. Also returns the number of expanded states at which the search calls
+    # report_progress (see next_report)
+    def start_search(self):
+        stats = self.stats = SearchStats()
+        if self.profile:
+            stats.movegen_time = 0.0
+        if self.cancel_token is not None and self.cancel_token.should_stop():
+            raise SearchCancelled("search cancelled before it started")
+        self.next_callback = self.progress_every
+        return stats, self.next_report(0)
+
+    # number of expanded states at which report_progress is called after expanded ones: at the next call of progress_callback
+    # or after CHECK_EVERY states when there is a cancel token. -1 (never reached) when there is neither
+    def next_report(self, expanded):
+        reports = []
+        if self.progress_callback is not None:
+            reports.append(self.next_callback)
+        if self.cancel_token is not None:
+            reports.append(expanded + CHECK_EVERY)
+        return min(reports) if reports else -1
+
+    # check the cancel token, give the counters so far (generated is the number of states generated up to now) to
+    # progress_callback when it is time to, and return the next number of expanded states to report at
+    def report_progress(self, stats, generated):
+        if self.cancel_token is not None and self.cancel_token.should_stop():
+            self.search_progress(stats, generated)
+            raise SearchCancelled("search cancelled after %d expanded states" % stats.nodes_expanded)
+        if self.progress_callback is not None and stats.nodes_expanded >= self.next_callback:
+            self.search_progress(stats, generated)
+            self.progress_callback(stats)
+            self.next_callback = stats.nodes_expanded + self.progress_every
+        return self.next_report(stats.nodes_expanded)
+
+    # raise SearchCancelled at once if the cancel token says so, for the searches where the steps between two calls of
+    # report_progress can take seconds (a whole layer of numpy_bfs)
+    def check_cancelled(self, stats, generated):
+        if self.cancel_token is not None and self.cancel_token.should_stop():
+            self.report_progress(stats, generated)
+
+    # SearchProgress of a search that is not over, with a copy of its counters up to now and the best solution found so far
+    def search_progress(self, stats, generated, path=None):
+        stats.nodes_generated = generated
+        stats.search_time = time.perf_counter() - stats.start_time
+        return SearchProgress(copy.copy(stats), path)
+
+    # run a solving generator (iter_bfs, ...) until the search is over and return its solution
+    def run_search(self, search):
+        for progress in search:
+            if progress.done:
+                return progress.path
+
+    # end of a search that generated states: the counters are final and the number of states is printed (if verbose)
+    def end_search(self, stats, generated):
+        stats.nodes_generated = generated
+        stats.search_time = time.perf_counter() - stats.start_time
+        if stats.movegen_time is not None:
+            stats.bookkeeping_time = stats.search_time - stats.movegen_time
+        if self.verbose:
+            print("States generated: ", generated)
+
+    # function computing the moves of a search: move itself (self.slide, ...), or when profiling a wrapper of it that adds
+    # its time to stats.movegen_time
+    def move_generator(self, stats, move):
+        if not self.profile:
+            return move
+
+        def timed_move(*args):
+            start_time = time.perf_counter()
+            result = move(*args)
+            stats.movegen_time += time.perf_counter() - start_time
+            return result
+        return timed_move
+
+    # number of bits used for the cell of one robot in a packed state (one byte on a 16x16 board)
+    def cell_bits(self):
+        return max(1, (self.size * self.size - 1).bit_length())
+
+    # pack the cells of the robots (in the order of canonical_order in the joint searches) in a single int
+    def pack_state(self, cells):
+        bits = self.cell_bits()
+        state = 0
+        for slot, cell in enumerate(cells):
+            state |= cell << (slot * bits)
+        return state
+
+    # inverse of pack_state: list with the cell of every robot
+    def unpack_state(self, state):
+        bits = self.cell_bits()
+        mask = (1 << bits) - 1
+        return [(state >> (slot * bits)) & mask for slot in range(len(self.initial_positions))]
+
+    # order of the robots in the states of the joint searches: the robots of goal_ids (those with the target color), then
+    # the others. Only a robot of goal_ids has to reach the target and the others are just blockers, so two states where
+    # blockers swapped their cells are solved by the same moves. A canonical state keeps the cells of each of the two
+    # groups sorted, which makes all those states a single one (up to 6 times fewer states with 3 blockers)
+    def canonical_order(self, goal_ids):
+        return sorted(goal_ids) + [robot_id for robot_id in sorted(self.initial_positions) if robot_id not in goal_ids]
+
+    # packed canonical state of cells, the cells of the robots in canonical_order (the num_goals robots of goal_ids first)
+    def canonical_state(self, cells, num_goals):
+        return self.pack_state(sorted(cells[:num_goals]) + sorted(cells[num_goals:]))
+
+    # canonical state after the robot of slot moves to stop in the canonical state of cells. The robots of its group (see
+    # canonical_order) are in slots first to last - 1, sorted by cell: the robot goes to the slot rank of its new cell among
+    # them and only the slots between its old and new rank are shifted. Returns the new state and rank
+    def canonical_move(self, state, cells, slot, stop, first, last, bits):
+        rank = slot
+        while rank > first and cells[rank - 1] > stop:
+            rank -= 1
+        while rank < last - 1 and cells[rank + 1] < stop:
+            rank += 1
+        if rank == slot:
+            return state + ((stop - cells[slot]) << (slot * bits)), rank
+        if rank < slot:
+            low = rank * bits
+            shifted = (state >> low) & ((1 << ((slot - rank) * bits)) - 1)  # slots rank to slot - 1, one slot up
+            cleared = state & ~((1 << ((slot + 1) * bits)) - (1 << low))
+            return cleared | (shifted << (low + bits)) | (stop << low), rank
+        low = slot * bits
+        shifted = (state >> (low + bits)) & ((1 << ((rank - slot) * bits)) - 1)  # slots slot + 1 to rank, one slot down
+        cleared = state & ~((1 << ((rank + 1) * bits)) - (1 << low))
+        return cleared | (shifted << low) | (stop << (rank * bits)), rank
+
+    # moves (robot_id, direction, new_pos) going through the canonical states of states, the first one being the start. A
+    # robot has no fixed slot in a canonical state, so every move is found again by trying the moves of all the robots
+    def canonical_path(self, states, goal_ids):
+        order = self.canonical_order(goal_ids)
+        size = self.size
+        cells = [self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1] for robot_id in order]
+        moves = [(slot, direction) for slot in range(len(order)) for direction in DIRECTIONS]
+        path = []
+        for state in states[1:]:
+            for slot, direction in moves:
+                stop = self.slide(cells[slot], direction, cells)
+                new_cells = cells[:slot] + [stop] + cells[slot + 1:]
+                if stop != cells[slot] and self.canonical_state(new_cells, len(goal_ids)) == state:
+                    break
+            cells = new_cells
+            path.append((order[slot], direction, divmod(stop, size)))
+        return path
+
+    # breadth-first search over canonical packed states (see canonical_order): only the robots in movable_ids are moved and
+    # the search stops when one of the robots in goal_ids is on the target. Every visited state only keeps a pointer to its
+    # parent state, so the path is rebuilt at the end instead of being copied for every node. Generator of SearchProgress,
+    # one every slice_size expanded states and a last one with the (robot_id, direction, new_pos) moves of the solution
+    def iter_packed_bfs(self, movable_ids, goal_ids, slice_size=SLICE_SIZE):
+        order = self.canonical_order(goal_ids)
+        size = self.size
+        bits = self.cell_bits()
+        mask = (1 << bits) - 1
+        num_robots = len(order)
+        num_goals = len(goal_ids)
+        movable_slots = [order.index(robot_id) for robot_id in movable_ids]
+        target = self.target[0] * size + self.target[1]
+        # first and last (excluded) slot of the group of every slot
+        groups = [(0, num_goals) if slot < num_goals else (num_goals, num_robots) for slot in range(num_robots)]
+        canonical_move = self.canonical_move
+
+        start = self.canonical_state([self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1]
+                                      for robot_id in order], num_goals)
+        parents = {start: None}  # packed state -> packed parent state
+        queue = deque([start])
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        layer_left = 1  # states of the current depth still in the queue (the queue then only holds the next depth)
+        next_slice = slice_size
+        i = 0
+        duplicates = 0  # kept in a local variable in this loop, stats.duplicate_hits is set from it
+
+        while queue:
+            if len(queue) > stats.peak_frontier:
+                stats.peak_frontier = len(queue)
+            if layer_left == 0:
+                stats.max_depth += 1
+                layer_left = len(queue)
+            layer_left -= 1
+            state = queue.popleft()
+            cells = [(state >> (slot * bits)) & mask for slot in range(num_robots)]
+            if target in cells[:num_goals]:
+                stats.duplicate_hits = duplicates
+                self.end_search(stats, i)
+                yield SearchProgress(stats, self.packed_path(parents, state, goal_ids), True)
+                return
+
+            stats.nodes_expanded += 1
+            if stats.nodes_expanded == next_report:
+                stats.duplicate_hits = duplicates
+                next_report = self.report_progress(stats, i)
+            if stats.nodes_expanded == next_slice:
+                next_slice += slice_size
+                stats.duplicate_hits = duplicates
+                yield self.search_progress(stats, i)
+            for slot in movable_slots:
+                cell = cells[slot]
+                occupied = cells[:slot] + cells[slot + 1:]
+                first, last = groups[slot]
+                for direction in DIRECTIONS:
+                    stop = slide(cell, direction, occupied)
+                    i += 1
+                    if stop == cell:
+                        continue
+                    # a robot that keeps its rank among the sorted cells of its group only changes its own slot
+                    if (slot == first or cells[slot - 1] < stop) and (slot == last - 1 or stop < cells[slot + 1]):
+                        new_state = state + ((stop - cell) << (slot * bits))
+                    else:
+                        new_state = canonical_move(state, cells, slot, stop, first, last, bits)[0]
+                    if new_state not in parents:
+                        parents[new_state] = state
+                        queue.append(new_state)
+                    else:
+                        duplicates += 1
+
+        stats.duplicate_hits = duplicates
+        self.end_search(stats, i)
+        yield SearchProgress(stats, None, True)  # No path found
+
+    # rebuild the moves leading to state by following the parent pointers of iter_packed_bfs (see canonical_path)
+    def packed_path(self, parents, state, goal_ids):
+        states = []
+        while state is not None:
+            states.append(state)
+            state = parents[state]
+        states.reverse()
+        return self.canonical_path(states, goal_ids)
+
     # apply BFS for our AI
+    @cached_solver
     def bfs(self):
+        return self.run_search(self.iter_bfs())
+
+    # bfs as a generator of SearchProgress (see iter_packed_bfs), so the search can be paused, resumed or abandoned between
+    # two slices. The solution is a list of (direction, new_pos) moves
+    def iter_bfs(self, slice_size=SLICE_SIZE):
         target_robot_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
 
         if not target_robot_ids:
-            return None  # No robot with the target color
+            yield SearchProgress(self.start_search()[0], None, True)  # No robot with the target color
+            return
+
+        for progress in self.iter_packed_bfs(target_robot_ids, target_robot_ids, slice_size):
+            if progress.path is not None:
+                self.move_along(progress.path)
+                progress.path = [(direction, new_pos) for _, direction, new_pos in progress.path]
+            yield progress
+
+    # apply a bidirectional BFS for our AI: like bfs, only the robot with the target color moves, but a forward search from
+    # its cell and a backward search from the target (over the cells that slide into a cell, see slide_sources) take turns
+    # expanding a whole depth, the smaller frontier first, until they meet. A state found by both searches is met at the
+    # deepest layer of the other one, so the first meeting gives a minimal list of (direction, new_pos) moves, like bfs
+    @cached_solver
+    def bidirectional_bfs(self):
+        return self.run_search(self.iter_bidirectional_bfs())
+
+    # bidirectional_bfs as a generator of SearchProgress (see iter_packed_bfs)
+    def iter_bidirectional_bfs(self, slice_size=SLICE_SIZE):
+        target_robot_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
+
+        if len(target_robot_ids) != 1:
+            yield from self.iter_bfs(slice_size)  # No robot with the target color, or several that can all reach it
+            return
+
+        robot_id = target_robot_ids[0]
+        size = self.size
+        start = self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1]
+        target = self.target[0] * size + self.target[1]
+        occupied = set(self.other_robot_cells(robot_id, self.initial_positions))
+        forward = {start: None}  # cell -> (previous cell, direction of the move from it)
+        backward = {target: None}  # cell -> (next cell towards the target, direction of the move to it)
+        forward_layer = [start]
+        # no robot can stop on a wall or on another robot
+        backward_layer = [target] if target not in occupied and not self.cell_walls[target] & BLOCKED else []
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        slide_sources = self.move_generator(stats, self.slide_sources)
+        meeting = start if start in backward else None
+        next_slice = slice_size
+        i = 0
+        duplicates = 0
+
+        while meeting is None and forward_layer and backward_layer:
+            stats.peak_frontier = max(stats.peak_frontier, len(forward_layer) + len(backward_layer))
+            stats.max_depth += 1
+            if len(forward_layer) <= len(backward_layer):
+                layer, visited, other = forward_layer, forward, backward
+            else:
+                layer, visited, other = backward_layer, backward, forward
+            new_layer = []
+            for cell in layer:
+                stats.nodes_expanded += 1
+                if stats.nodes_expanded == next_report:
+                    stats.duplicate_hits = duplicates
+                    next_report = self.report_progress(stats, i)
+                if stats.nodes_expanded == next_slice:
+                    next_slice += slice_size
+                    stats.duplicate_hits = duplicates
+                    yield self.search_progress(stats, i)
+                for direction in DIRECTIONS:
+                    if visited is forward:
+                        neighbours = [slide(cell, direction, occupied)]
+                    else:
+                        neighbours = slide_sources(cell, direction, occupied)
+                    for neighbour in neighbours:
+                        i += 1
+                        if neighbour == cell:
+                            continue
+                        if neighbour in visited:
+                            duplicates += 1
+                            continue
+                        visited[neighbour] = (cell, direction)
+                        new_layer.append(neighbour)
+                        if neighbour in other:
+                            meeting = neighbour
+                            break
+                    if meeting is not None:
+                        break
+                if meeting is not None:
+                    break
+            if visited is forward:
+                forward_layer = new_layer
+            else:
+                backward_layer = new_layer
+
+        stats.duplicate_hits = duplicates
+        self.end_search(stats, i)
+        if meeting is None:
+            yield SearchProgress(stats, None, True)  # No path found
+            return
+        path = []
+        cell = meeting
+        while forward[cell] is not None:
+            previous, direction = forward[cell]
+            path.append((direction, divmod(cell, size)))
+            cell = previous
+        path.reverse()
+        cell = meeting
+        while backward[cell] is not None:
+            cell, direction = backward[cell]
+            path.append((direction, divmod(cell, size)))
+        x, y = divmod(target, size)
+        self.colored_robots[robot_id] = (x, y, self.colored_robots[robot_id][2])
+        yield SearchProgress(stats, path, True)
+
+    # apply BFS over the joint positions of all the robots for our AI: any robot can move and the robot with the target color
+    # has to end on the target. Being a BFS, the returned list of (robot_id, direction, new_pos) moves is a minimal one
+    @cached_solver
+    def multi_robot_bfs(self):
+        return self.run_search(self.iter_multi_robot_bfs())
+
+    # multi_robot_bfs as a generator of SearchProgress (see iter_packed_bfs)
+    def iter_multi_robot_bfs(self, slice_size=SLICE_SIZE):
+        target_robot_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
 
-        initial_positions = {robot_id: self.initial_positions[robot_id][:2] for robot_id in target_robot_ids}
-        queue = deque([(initial_positions, 0, [])])
-        visited = set([tuple(initial_positions.values())])
+        if self.prove_unsolvable() is not None:
+            yield SearchProgress(self.start_search()[0], None, True)  # No solution (e.g. no robot with the target color)
+            return
+
+        yield from self.iter_packed_bfs(sorted(self.initial_positions), target_robot_ids, slice_size)
+
+    # apply a layered BFS over the joint positions of all the robots for our AI, like multi_robot_bfs, but with NumPy (which
+    # is only needed by this solver): every layer of the search is an array of packed states, the stops of all the states for
+    # one robot and one direction are computed at once from the stop table and the other robots, and the new states are
+    # removed from the visited ones with sorted array operations. Returns a minimal list of (robot_id, direction, new_pos) moves
+    @cached_solver
+    def numpy_bfs(self):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("numpy_bfs needs NumPy (pip install numpy)")
+
+        goal_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
+        order = self.canonical_order(goal_ids)
+        num_goals = len(goal_ids)
+
+        if self.prove_unsolvable() is not None:
+            self.stats = SearchStats()
+            return None  # No solution (e.g. no robot with the target color)
+
+        size = self.size
+        bits = self.cell_bits()
+        if bits * len(order) > 64:
+            raise ValueError("numpy_bfs packs the robots in 64 bits, use multi_robot_bfs for this board")
+        if self.stop_table is None:
+            self.build_stop_table()
+        stop_tables = [np.array(self.stop_table[direction], dtype=np.int64) for direction in DIRECTIONS]
+        steps = [-size, size, -1, 1]  # cell step of each direction of DIRECTIONS
+        mask = (1 << bits) - 1
+        target = self.target[0] * size + self.target[1]
+
+        start = self.canonical_state([self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1]
+                                      for robot_id in order], num_goals)
+        layers = [np.array([start], dtype=np.uint64)]  # canonical states (see canonical_order) of every depth
+        parents = [None]  # for every state of a layer, index of its parent in the previous layer
+        visited = layers[0]  # sorted array of all the states found
+        stats, next_report = self.start_search()
+
+        while True:
+            frontier = layers[-1]
+            stats.max_depth = len(layers) - 1
+            stats.peak_frontier = max(stats.peak_frontier, len(frontier))
+            cells = [((frontier >> np.uint64(slot * bits)) & np.uint64(mask)).astype(np.int64) for slot in range(len(order))]
+
+            at_target = np.zeros(len(frontier), dtype=bool)
+            for slot in range(num_goals):
+                at_target |= cells[slot] == target
+            if at_target.any():
+                self.end_search(stats, stats.nodes_generated)
+                return self.numpy_path(layers, parents, int(np.argmax(at_target)), goal_ids)
+
+            stats.nodes_expanded += len(frontier)
+            if 0 <= next_report <= stats.nodes_expanded:
+                next_report = self.report_progress(stats, stats.nodes_generated)
+            if self.profile:
+                movegen_start = time.perf_counter()
+            new_states, new_parents = [], []
+            for slot in range(len(order)):
+                cell = cells[slot]
+                clear_slot = np.uint64(~(mask << (slot * bits)) & (2 ** 64 - 1))
+                group = range(num_goals) if slot < num_goals else range(num_goals, len(order))
+                clear_group = np.uint64(~sum(mask << (group_slot * bits) for group_slot in group) & (2 ** 64 - 1))
+                for direction_index, step in enumerate(steps):
+                    self.check_cancelled(stats, stats.nodes_generated)
+                    stop = stop_tables[direction_index][cell]
+                    # the robots between the cell and the stop shorten the move, one robot after the other like in slide
+                    for other_slot in range(len(order)):
+                        if other_slot == slot:
+                            continue
+                        other = cells[other_slot]
+                        if step < 0:
+                            blocked = (other >= stop) & (other < cell)
+                        else:
+                            blocked = (other > cell) & (other <= stop)
+                        if abs(step) == size:
+                            blocked &= (other - cell) % size == 0
+                        stop = np.where(blocked, other - step, stop)
+                    moved = np.nonzero(stop != cell)[0]
+                    states = (frontier[moved] & clear_slot) | (stop[moved].astype(np.uint64) << np.uint64(slot * bits))
+                    if len(group) > 1:
+                        # canonical states: the cells of the group of the robot are sorted again
+                        group_cells = np.sort(np.stack([(states >> np.uint64(group_slot * bits)) & np.uint64(mask)
+                                                        for group_slot in group], axis=1), axis=1)
+                        states &= clear_group
+                        for column, group_slot in enumerate(group):
+                            states |= group_cells[:, column] << np.uint64(group_slot * bits)
+                    new_states.append(states)
+                    new_parents.append(moved)
+
+            if self.profile:
+                stats.movegen_time += time.perf_counter() - movegen_start
+
+            new_states = np.concatenate(new_states)
+            stats.nodes_generated += len(new_states)
+            self.check_cancelled(stats, stats.nodes_generated)
+            new_states, first = np.unique(new_states, return_index=True)
+            positions = np.minimum(np.searchsorted(visited, new_states), len(visited) - 1)
+            unseen = visited[positions] != new_states
+            stats.duplicate_hits += sum(len(states) for states in new_parents) - int(unseen.sum())
+            if not unseen.any():
+                self.end_search(stats, stats.nodes_generated)
+                return None  # No path found
+            first = first[unseen]
+            layers.append(new_states[unseen])
+            parents.append(np.concatenate(new_parents)[first])
+            self.check_cancelled(stats, stats.nodes_generated)
+            # the new states are sorted and not in visited: they are inserted in place instead of sorting everything again
+            visited = np.insert(visited, np.searchsorted(visited, layers[-1]), layers[-1])
+
+    # rebuild the moves leading to the state index of the last layer of numpy_bfs (see canonical_path)
+    def numpy_path(self, layers, parents, index, goal_ids):
+        states = [int(layers[-1][index])]
+        for depth in range(len(layers) - 1, 0, -1):
+            index = int(parents[depth][index])
+            states.append(int(layers[depth - 1][index]))
+        states.reverse()
+        return self.canonical_path(states, goal_ids)
+
+    # apply a layered BFS over the joint positions of all the robots for our AI, like multi_robot_bfs, but with the states on
+    # disk (in a temporary directory in directory, the default one of tempfile if None) so boards with more states than the
+    # memory can be solved. Every layer is a file of sorted canonical states (see canonical_order). The states generated from
+    # a layer are kept in memory up to buffer_states of them, then sorted and written as a run. The runs are merged and the
+    # states already visited are removed by walking the merged runs and the sorted file of all the visited states side by
+    # side, which also writes the next file of visited states. No parent is stored: the path is rebuilt at the end by going
+    # back through the layers, finding in each one a state with a move to the next state of the path. Returns a minimal list
+    # of (robot_id, direction, new_pos) moves, or None once a layer has no new state (the board has no solution)
+    @cached_solver
+    def external_bfs(self, directory=None, buffer_states=EXTERNAL_BUFFER):
+        goal_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
+        if self.prove_unsolvable() is not None:
+            self.stats = SearchStats()
+            return None  # No solution (e.g. no robot with the target color)
+
+        order = self.canonical_order(goal_ids)
+        size = self.size
+        bits = self.cell_bits()
+        mask = (1 << bits) - 1
+        num_robots = len(order)
+        num_goals = len(goal_ids)
+        width = (bits * num_robots + 7) // 8  # bytes of a state in the files
+        target = self.target[0] * size + self.target[1]
+        groups = [(0, num_goals) if slot < num_goals else (num_goals, num_robots) for slot in range(num_robots)]
+        canonical_move = self.canonical_move
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+
+        # canonical states one move away from state, and whether a robot of goal_ids stopped on the target
+        def expand(state):
+            cells = [(state >> (slot * bits)) & mask for slot in range(num_robots)]
+            for slot in range(num_robots):
+                cell = cells[slot]
+                occupied = cells[:slot] + cells[slot + 1:]
+                first, last = groups[slot]
+                for direction in DIRECTIONS:
+                    stop = slide(cell, direction, occupied)
+                    if stop == cell:
+                        continue
+                    if (slot == first or cells[slot - 1] < stop) and (slot == last - 1 or stop < cells[slot + 1]):
+                        yield state + ((stop - cell) << (slot * bits)), stop == target and slot < num_goals
+                    else:
+                        yield canonical_move(state, cells, slot, stop, first, last, bits)[0], stop == target and slot < num_goals
+
+        start = self.canonical_state([self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1]
+                                      for robot_id in order], num_goals)
+        if target in [(start >> (slot * bits)) & mask for slot in range(num_goals)]:
+            self.end_search(stats, 0)
+            return []
+
+        with tempfile.TemporaryDirectory(prefix='ricochet-bfs-', dir=directory) as folder:
+            layers = [os.path.join(folder, 'layer0')]  # file of the states of every depth
+            write_states(layers[0], [start], width)
+            visited = os.path.join(folder, 'visited0')  # file of all the states of the layers
+            write_states(visited, [start], width)
+            generated = 0
+            goal = None
+            while goal is None:
+                depth = len(layers) - 1
+                stats.max_depth = depth
+                layer_start = generated
+                runs = []
+                buffer = []
+                for state in read_states(layers[depth], width):
+                    stats.nodes_expanded += 1
+                    if stats.nodes_expanded == next_report:
+                        next_report = self.report_progress(stats, generated)
+                    for new_state, at_target in expand(state):
+                        generated += 1
+                        if at_target:
+                            goal = new_state
+                            break
+                        buffer.append(new_state)
+                    if goal is not None:
+                        break
+                    if len(buffer) >= buffer_states:
+                        runs.append(os.path.join(folder, 'run%d' % len(runs)))
+                        write_states(runs[-1], sorted(set(buffer)), width)
+                        buffer = []
+                if goal is not None:
+                    break
+                runs.append(os.path.join(folder, 'run%d' % len(runs)))
+                write_states(runs[-1], sorted(set(buffer)), width)
+                buffer = None
+
+                # merge the runs without duplicates and keep the states that are not in visited
+                layers.append(os.path.join(folder, 'layer%d' % (depth + 1)))
+                new_visited = os.path.join(folder, 'visited%d' % (depth + 1))
+                new_states = 0
+                with open(layers[-1], 'wb') as layer_file, open(new_visited, 'wb') as visited_file:
+                    seen = read_states(visited, width)
+                    old = next(seen, None)
+                    previous = None
+                    for state in heapq.merge(*[read_states(run, width) for run in runs]):
+                        if state == previous:
+                            continue
+                        previous = state
+                        while old is not None and old < state:
+                            visited_file.write(old.to_bytes(width, 'big'))
+                            old = next(seen, None)
+                        if old == state:
+                            continue
+                        layer_file.write(state.to_bytes(width, 'big'))
+                        visited_file.write(state.to_bytes(width, 'big'))
+                        new_states += 1
+                    while old is not None:
+                        visited_file.write(old.to_bytes(width, 'big'))
+                        old = next(seen, None)
+                for run in runs:
+                    os.remove(run)
+                os.remove(visited)
+                visited = new_visited
+                stats.peak_frontier = max(stats.peak_frontier, new_states)
+                stats.duplicate_hits += generated - layer_start - new_states
+                if new_states == 0:
+                    self.end_search(stats, generated)
+                    return None  # No path found
+
+            # backward pass: the parent of every state of the path is a state of the previous layer with a move to it
+            states = [goal]
+            for depth in range(len(layers) - 1, -1, -1):
+                for state in read_states(layers[depth], width):
+                    if any(new_state == states[-1] for new_state, _ in expand(state)):
+                        states.append(state)
+                        break
+
+        self.end_search(stats, generated)
+        states.reverse()
+        return self.canonical_path(states, goal_ids)
+
+    # apply IDA* over the joint positions of all the robots for our AI. The robots are moved and moved back on a single list of
+    # cells (no copies per node) and the f-bound grows every iteration, so the memory only depends on the depth of the solution
+    # and on the transposition table, which gets an entry per searched state up to table_size entries. An entry keeps a
+    # canonical packed state (see canonical_order), the iteration and the depth it was reached at (to prune repeated states)
+    # and a learned lower bound of its remaining moves (kept across iterations).
+    # Returns a minimal list of (robot_id, direction, new_pos) moves, like multi_robot_bfs
+    @cached_solver
+    def ida_star(self, table_size=1 << 20):
+        goal_ids = [robot_id for robot_id, (_, _, color) in self.initial_positions.items() if color == self.target_color]
+        num_goals = len(goal_ids)
+
+        if self.prove_unsolvable() is not None:
+            self.stats = SearchStats()
+            return None  # No solution (e.g. no robot with the target color)
+
+        size = self.size
+        bits = self.cell_bits()
+        distances = self.lower_bound_distances()
+        target = self.target[0] * size + self.target[1]
+        # the cells stay in the order of the canonical state (the cells of each group sorted, see canonical_order), and
+        # robot_ids says which robot is on each of them
+        robots = [(self.initial_positions[robot_id][0] * size + self.initial_positions[robot_id][1], robot_id)
+                  for robot_id in self.canonical_order(goal_ids)]
+        robots = sorted(robots[:num_goals]) + sorted(robots[num_goals:])
+        cells = [cell for cell, _ in robots]
+        robot_ids = [robot_id for _, robot_id in robots]
+        groups = [(0, num_goals) if slot < num_goals else (num_goals, len(cells)) for slot in range(len(cells))]
+        moves = []
+        found = -1
+        infinity = float('inf')
+
+        # transposition table: index -> [state, iteration, depth, bound]
+        table = {}
+        iteration = 0
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        canonical_move = self.canonical_move
         i = 0
 
-        while queue:
-            current_positions, steps, path = queue.popleft()
-            if any(pos == self.target for pos in current_positions.values()):
-                self.colored_robots = self.robots
-                print("State generated: ",i)
-                return path
-
-            for robot_id, current_pos in current_positions.items():
-                for direction in ['up', 'down', 'left', 'right']:
-                    new_pos = self.move_in_direction(current_pos, direction, robot_id)
-                    new_positions = {k: v for k, v in current_positions.items()}
-                    new_positions[robot_id] = new_pos
-                    i+=1
-                    if tuple(new_positions.values()) not in visited:
-                        visited.add(tuple(new_positions.values()))
-                        queue.append((new_positions, steps + 1, path + [(direction, new_pos)]))
-
-        return None  # No path found
+        # returns (found, True) when the goal is reached, otherwise the smallest f above the bound and whether the whole subtree
+        # was searched (a subtree with pruned repeated states can not be used to learn a lower bound)
+        def search(state, depth, bound):
+            nonlocal i, next_report
+            remaining = [distances[cell] for cell in cells[:num_goals] if distances[cell] is not None]
+            if not remaining:
+                return infinity, True
+            estimate = min(remaining)
+
+            index = (state * 0x9E3779B97F4A7C15 >> 17) % table_size
+            entry = table.get(index)
+            if entry is not None and entry[0] == state:
+                if entry[1] == iteration and entry[2] <= depth:
+                    stats.duplicate_hits += 1
+                    return None, False  # already searched in this iteration from the same or a lower depth
+                estimate = max(estimate, entry[3])
+            if depth + estimate > bound:
+                return depth + estimate, True
+            if target in cells[:num_goals]:
+                return found, True
+
+            # replacement policy: free or outdated slots, or a shallower depth than the stored one
+            if entry is None or entry[0] != state:
+                if entry is None or entry[1] != iteration or depth <= entry[2]:
+                    table[index] = [state, iteration, depth, estimate]
+            else:
+                entry[1] = iteration
+                entry[2] = depth
+
+            stats.nodes_expanded += 1
+            if stats.nodes_expanded == next_report:
+                next_report = self.report_progress(stats, i)
+            if depth + 1 > stats.peak_frontier:
+                stats.peak_frontier = depth + 1
+                stats.max_depth = depth
+            minimum = infinity
+            complete = True
+            for slot in range(len(cells)):
+                cell = cells[slot]
+                robot_id = robot_ids[slot]
+                first, last = groups[slot]
+                for direction in DIRECTIONS:
+                    # the robot's own cell never blocks its move, so the full list of cells can be given as occupied
+                    stop = slide(cell, direction, cells)
+                    i += 1
+                    if stop == cell:
+                        continue
+                    # a robot that keeps its rank among the sorted cells of its group only changes its own slot
+                    if (slot == first or cells[slot - 1] < stop) and (slot == last - 1 or stop < cells[slot + 1]):
+                        new_state, rank = state + ((stop - cell) << (slot * bits)), slot
+                    else:
+                        new_state, rank = canonical_move(state, cells, slot, stop, first, last, bits)
+                    if rank == slot:
+                        cells[slot] = stop
+                    else:
+                        del cells[slot], robot_ids[slot]
+                        cells.insert(rank, stop)
+                        robot_ids.insert(rank, robot_id)
+                    moves.append((robot_id, direction, divmod(stop, size)))
+                    result, searched = search(new_state, depth + 1, bound)
+                    if result == found:
+                        return found, True
+                    moves.pop()
+                    if rank == slot:
+                        cells[slot] = cell
+                    else:
+                        del cells[rank], robot_ids[rank]
+                        cells.insert(slot, cell)
+                        robot_ids.insert(slot, robot_id)
+                    complete = complete and searched
+                    if result is not None and result < minimum:
+                        minimum = result
+
+            entry = table.get(index)  # the children may have replaced it
+            if complete and entry is not None and entry[0] == state:
+                entry[3] = max(entry[3], minimum - depth)
+            return minimum, complete
+
+        start = self.pack_state(cells)
+        bound = 0
+        while True:
+            iteration += 1
+            result, _ = search(start, 0, bound)
+            if result == found:
+                self.end_search(stats, i)
+                return list(moves)
+            if result == infinity:
+                self.end_search(stats, i)
+                return None  # No path found
+            bound = result
 
     # apply DFS for our AI
+    @cached_solver
     def dfs(self):
+        return self.run_search(self.iter_dfs())
+
+    # dfs as a generator of SearchProgress, one every slice_size expanded states. With anytime, the search goes on after the
+    # first solution (every SearchProgress then has the shortest solution found so far) and only looks for shorter ones: a
+    # cell is searched again when it is reached with fewer moves, so the last solution is a minimal one
+    def iter_dfs(self, slice_size=SLICE_SIZE, anytime=False):
         target_robot_id = None
         for robot_id, (_, _, color) in self.initial_positions.items():
             if color == self.target_color:
@@ -323,184 +1347,365 @@ class RicochetRobots:
                 break
 
         if target_robot_id is None:
-            return None  # No robot with the target color
+            yield SearchProgress(self.start_search()[0], None, True)  # No robot with the target color
+            return
 
         queue = deque([((target_robot_id, self.initial_positions[target_robot_id][:2]), 0, [])])
-        visited = set([self.initial_positions[target_robot_id]])
+        visited = {self.initial_positions[target_robot_id]: 0}  # position -> fewest moves it was reached with
+        occupied = self.other_robot_cells(target_robot_id, self.robots)
+        size = self.size
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        next_slice = slice_size
+        best = None
         i = 0
 
         while queue:
+            if len(queue) > stats.peak_frontier:
+                stats.peak_frontier = len(queue)
             (current_robot_id, current_pos), steps, path = queue.popleft()
+            if steps > stats.max_depth:
+                stats.max_depth = steps
             if current_pos == self.target:
-                print("States generated: ",i)
-                return path
-
+                if not anytime:
+                    self.end_search(stats, i)
+                    yield SearchProgress(stats, path, True)
+                    return
+                if best is None or len(path) < len(best):
+                    best = path
+                    yield self.search_progress(stats, i, best)
+                continue
+            if best is not None and steps + 1 >= len(best):
+                continue  # can not lead to a shorter solution
+
+            stats.nodes_expanded += 1
+            if stats.nodes_expanded == next_report:
+                next_report = self.report_progress(stats, i)
+            if stats.nodes_expanded == next_slice:
+                next_slice += slice_size
+                yield self.search_progress(stats, i, best)
             for direction in ['up', 'down', 'left', 'right']:
                 i+=1
-                new_pos = self.move_in_direction(current_pos, direction, target_robot_id)
-                if new_pos not in visited:
-                    visited.add(new_pos)
+                new_pos = divmod(slide(current_pos[0] * size + current_pos[1], direction, occupied), size)
+                if new_pos not in visited or (anytime and steps + 1 < visited[new_pos]):
+                    visited[new_pos] = steps + 1
                     queue.appendleft(((current_robot_id, new_pos), steps + 1, path + [(direction, new_pos)]))
+                else:
+                    stats.duplicate_hits += 1
 
-        return None  # No path found
+        self.end_search(stats, i)
+        yield SearchProgress(stats, best, True)  # best is None when no path was found
     
-    # apply Greedy Best-First Search algorithm with Manhattan distance heuristic for our AI
-    def greedy_best_first_search(self):
-        target_robot_id = None
-        for robot_id, (_, _, color) in self.initial_positions.items():
+    # minimum number of moves for a single robot to go from every cell to the target (self.target if None) when the other
+    # robots stay on the cells in occupied. It is a backward BFS from the target over the cells that slide into the current
+    # one, done once per target and blockers (the maps are kept in self.distance_maps until the walls change). Cells that can
+    # not reach the target are None
+    def target_distances(self, occupied=(), target=None):
+        key = (tuple(target or self.target), tuple(sorted(occupied)))
+        if key in self.distance_maps:
+            return self.recall_distances(key)
+
+        size = self.size
+        cell_walls = self.cell_walls
+        blocked = set(occupied)
+        distances = [None] * (size * size)
+        target = key[0][0] * size + key[0][1]
+        distances[target] = 0
+        # no robot can stop on a wall or on another robot
+        queue = deque([target] if target not in blocked and not cell_walls[target] & BLOCKED else [])
+        while queue:
+            cell = queue.popleft()
+            for direction, (dx, dy) in DIRECTION_DELTAS.items():
+                step = dx * size + dy
+                # a robot moving in direction only stops on cell if there is a wall or a robot right after it...
+                if not cell_walls[cell] & WALL_BITS[direction] and cell + step not in blocked:
+                    continue
+                # ...and then it comes from any cell before it, up to a wall or a robot
+                back = WALL_BITS[OPPOSITE[direction]]
+                previous = cell
+                while not cell_walls[previous] & back and previous - step not in blocked:
+                    previous -= step
+                    if distances[previous] is None:
+                        distances[previous] = distances[cell] + 1
+                        queue.append(previous)
+        self.remember_distances(key, distances)
+        return distances
+
+    # keep a distance map in self.distance_maps, which holds at most MAX_DISTANCE_MAPS of them (the least recently used one is
+    # removed first)
+    def remember_distances(self, key, distances):
+        if len(self.distance_maps) >= MAX_DISTANCE_MAPS:
+            del self.distance_maps[next(iter(self.distance_maps))]
+        self.distance_maps[key] = distances
+
+    # distance map of key, moved to the end of self.distance_maps (the most recently used)
+    def recall_distances(self, key):
+        distances = self.distance_maps[key] = self.distance_maps.pop(key)
+        return distances
+
+    # lower bound of the number of moves from every cell to the target (self.target if None) when the other robots can move
+    # too. Any robot may become a blocker, so a robot is allowed to stop on every cell of its slide and not only where the
+    # walls stop it (None if the target can not be reached at all). Used as the admissible heuristic of ida_star
+    def lower_bound_distances(self, target=None):
+        key = (tuple(target or self.target), None)
+        if key in self.distance_maps:
+            return self.recall_distances(key)
+
+        size = self.size
+        cell_walls = self.cell_walls
+        distances = [None] * (size * size)
+        target = key[0][0] * size + key[0][1]
+        distances[target] = 0
+        queue = deque([target])
+        while queue:
+            cell = queue.popleft()
+            for direction, (dx, dy) in DIRECTION_DELTAS.items():
+                # every cell on this side of cell, up to the first wall, can slide through cell
+                wall = WALL_BITS[direction]
+                previous = cell
+                while not cell_walls[previous] & wall:
+                    previous += dx * size + dy
+                    if distances[previous] is None:
+                        distances[previous] = distances[cell] + 1
+                        queue.append(previous)
+        self.remember_distances(key, distances)
+        return distances
+
+    # cells where robots starting on the cells of starts can stop, if a robot can also stop right before any cell of blockers
+    # (where another robot may stand). Without blockers, the robots of starts are the blockers of each other: a robot may
+    # stop before any cell found for any of them, so new cells give new stops until no new cell is found
+    def reachable_cells(self, starts, blockers=None):
+        if self.stop_table is None:
+            self.build_stop_table()
+        size = self.size
+        cell_walls = self.cell_walls
+        cells = set(starts)
+        if blockers is None:
+            blockers = cells
+        queue = deque(cells)
+        while queue:
+            cell = queue.popleft()
+            for direction, (dx, dy) in DIRECTION_DELTAS.items():
+                step = dx * size + dy
+                # stops of a robot leaving cell: the wall at the end of the slide and every cell before a blocker
+                stop = self.stop_table[direction][cell]
+                current = cell
+                while current != stop:
+                    current += step
+                    if (current == stop or current + step in blockers) and current not in cells:
+                        cells.add(current)
+                        queue.append(current)
+                # a robot on cell is a blocker too: a robot sliding in direction from a cell already found stops before it
+                if blockers is not cells or cell_walls[cell] & WALL_BITS[OPPOSITE[direction]]:
+                    continue
+                before = cell - step
+                if before in cells:
+                    continue
+                back = WALL_BITS[OPPOSITE[direction]]
+                previous = before
+                while not cell_walls[previous] & back:
+                    previous -= step
+                    if previous in cells:
+                        cells.add(before)
+                        queue.append(before)
+                        break
+        return cells
+
+    # reason (a sentence) why the board has no solution, found without searching, or None when it may have one. A robot only
+    # stops before a wall or before another robot, and the other robots can only be on cells they can reach, so the cells
+    # where any robot can ever stop are found first (reachable_cells) and the robot with the target color must be able to
+    # stop on the target when any of them may hold a blocker. It takes milliseconds where a solver goes through every
+    # position of the robots before giving up (level 3)
+    def prove_unsolvable(self):
+        size = self.size
+        starts = [x * size + y for x, y, color in self.initial_positions.values() if color == self.target_color]
+        if not starts:
+            return "no robot has the color of the target"
+        target = self.target[0] * size + self.target[1]
+        if target in starts:
+            return None
+        if self.cell_walls[target] & BLOCKED:
+            return "the target is on a wall"
+        lower_bounds = self.lower_bound_distances()
+        if all(lower_bounds[start] is None for start in starts):
+            return "the robot with the target color can not reach the target even if it could stop on every cell"
+        # they only depend on the cells of the robots, so they are kept for the next targets (see GameSession)
+        robot_cells = tuple(sorted(x * size + y for x, y, _ in self.initial_positions.values()))
+        blockers = self.reachable_maps.get(robot_cells)
+        if blockers is None:
+            blockers = self.reachable_cells(robot_cells)
+            if len(self.reachable_maps) >= MAX_DISTANCE_MAPS:
+                del self.reachable_maps[next(iter(self.reachable_maps))]
+            self.reachable_maps[robot_cells] = blockers
+        if target not in blockers:
+            return "no robot can ever stop on the target (the robots can only stop on %d cells)" % len(blockers)
+        cells = self.reachable_cells(starts, blockers)
+        if target not in cells:
+            return ("the robot with the target color can only stop on %d cells, even with blockers on all the %d cells the "
+                    "robots can reach, and the target is not one of them" % (len(cells), len(blockers)))
+        return None
+
+    # start cell of the robot with the target color and cells of the other robots, used by A_star and greedy_best_first_search
+    def target_robot_cells(self):
+        for robot_id, (x, y, color) in self.initial_positions.items():
             if color == self.target_color:
-                target_robot_id = robot_id
-                break
-
-        if target_robot_id is None:
-            return None  # No robot with the target color
+                return x * self.size + y, self.other_robot_cells(robot_id, self.initial_positions)
+        return None, None
 
-        start_node = (target_robot_id, self.initial_positions[target_robot_id][:2])
-        goal_node = self.target
-
-        # Initialize open and closed lists
-        open_list = deque([start_node])
+    # apply Greedy Best-First Search algorithm for our AI, the heuristic being the number of moves from target_distances
+    @cached_solver
+    def greedy_best_first_search(self):
+        return self.run_search(self.iter_greedy_best_first_search())
+
+    # greedy_best_first_search as a generator of SearchProgress, one every slice_size expanded states and a last one with
+    # the solution
+    def iter_greedy_best_first_search(self, slice_size=SLICE_SIZE):
+        start, occupied = self.target_robot_cells()
+        if start is None:
+            yield SearchProgress(self.start_search()[0], None, True)  # No robot with the target color
+            return
+
+        distances = self.target_distances(occupied)
+        goal_node = self.target[0] * self.size + self.target[1]
+        if distances[start] is None:
+            yield SearchProgress(self.start_search()[0], None, True)  # No path found
+            return
+
+        # The open list is a heap ordered by the heuristic estimate
+        open_list = [(distances[start], start)]
         closed_list = set()
 
-        # Dictionary to store the parent node for each visited node
-        parents = {}
-        node_number = 0
+        # Dictionary to store the parent node (and the direction used to leave it) for each visited node, and its number of moves
+        parents = {start: None}
+        depths = {start: 0}
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        next_slice = slice_size
+        i = 0
 
         while open_list:
+            if len(open_list) > stats.peak_frontier:
+                stats.peak_frontier = len(open_list)
             # Get the node with the lowest heuristic estimate
-            current_node = min(open_list, key=lambda x: self.calculate_heuristic(x[1], goal_node))
-
-            open_list.remove(current_node)
+            _, current_node = heapq.heappop(open_list)
+            if current_node in closed_list:
+                continue
+            if depths[current_node] > stats.max_depth:
+                stats.max_depth = depths[current_node]
 
             # Check if the current node is the goal node
-            if current_node[1] == goal_node:
-                return self.reconstruct_path(parents, direction, current_node[1])
+            if current_node == goal_node:
+                self.end_search(stats, i)
+                yield SearchProgress(stats, self.reconstruct_path(parents, current_node), True)
+                return
 
             # Expand the current node
-            for direction in ['up', 'down', 'left', 'right']:
-                new_pos = self.move_in_direction(current_node[1], direction, current_node[0])
-                new_node = (current_node[0], new_pos)
-
-                if new_pos is None:
+            stats.nodes_expanded += 1
+            if stats.nodes_expanded == next_report:
+                next_report = self.report_progress(stats, i)
+            if stats.nodes_expanded == next_slice:
+                next_slice += slice_size
+                yield self.search_progress(stats, i)
+            closed_list.add(current_node)
+            for direction in DIRECTIONS:
+                new_node = slide(current_node, direction, occupied)
+                i += 1
+                if new_node == current_node or distances[new_node] is None:
                     continue
-
-                # Check if the new node is already in the closed list
-                if new_node in closed_list:
+                if new_node in parents:
+                    stats.duplicate_hits += 1
                     continue
+                parents[new_node] = (current_node, direction)
+                depths[new_node] = depths[current_node] + 1
+                heapq.heappush(open_list, (distances[new_node], new_node))
 
-                # Add the new node to the open list with the heuristic estimate
-                open_list.append(new_node)
-
-                # Set the parent node for the new node
-                parents[node_number] = (direction, current_node[1])
-                node_number += 1
-
-            # Add the current node to the closed list
-            closed_list.add(current_node)
-
-        return None  # No path found
+        self.end_search(stats, i)
+        yield SearchProgress(stats, None, True)  # No path found
 
 
-    # apply A* algorithm with Manhattan distance heuristic for our AI
+    # apply A* algorithm for our AI, the heuristic being the number of moves from target_distances
+    @cached_solver
     def A_star(self):
-        target_robot_id = None
-        for robot_id, (_, _, color) in self.initial_positions.items():
-            if color == self.target_color:
-                target_robot_id = robot_id
-                break
-
-        if target_robot_id is None:
-            return None  # No robot with the target color
-        start_node = (target_robot_id, self.initial_positions[target_robot_id][:2])
-        #print("This is start node: ",start_node)
-        goal_node = self.target
-        # Initialize open and closed lists
-        open_list = deque([start_node])
-        closed_list = set()
-
-        # Dictionary to store the parent node for each visited node
-        parents = {}
-        node_number = 0
+        return self.run_search(self.iter_A_star())
+
+    # A_star as a generator of SearchProgress, one every slice_size expanded states and a last one with the solution
+    def iter_A_star(self, slice_size=SLICE_SIZE):
+        start, occupied = self.target_robot_cells()
+        if start is None:
+            yield SearchProgress(self.start_search()[0], None, True)  # No robot with the target color
+            return
+
+        distances = self.target_distances(occupied)
+        goal_node = self.target[0] * self.size + self.target[1]
+        if distances[start] is None:
+            yield SearchProgress(self.start_search()[0], None, True)  # No path found
+            return
+
+        # The open list is a heap ordered by the combined cost (actual cost + heuristic estimate), g_costs keeps the best actual cost
+        open_list = [(distances[start], 0, start)]
+        g_costs = {start: 0}
+
+        # Dictionary to store the parent node (and the direction used to leave it) for each visited node
+        parents = {start: None}
+        stats, next_report = self.start_search()
+        slide = self.move_generator(stats, self.slide)
+        next_slice = slice_size
+        i = 0
 
         while open_list:
-            # Get the node with the lowest combined cost (actual cost + heuristic estimate)
-            current_node = min(open_list, key=lambda x: self.calculate_combined_cost(x, goal_node))
-            open_list.remove(current_node)
-
-             # Check if the current node is the goal node
-            if current_node[1] == goal_node:
-                return self.reconstruct_path(parents, direction, current_node[1])
-            
-            # Expand the current node
-            for direction in ['up', 'down', 'left', 'right']:
-                new_pos = self.move_in_direction(current_node[1], direction, current_node[0])
-                new_node = (current_node[0], new_pos)
+            if len(open_list) > stats.peak_frontier:
+                stats.peak_frontier = len(open_list)
+            # Get the node with the lowest combined cost
+            _, cost, current_node = heapq.heappop(open_list)
+            if cost > g_costs[current_node]:
+                continue  # a cheaper path to this node was already expanded
+            if cost > stats.max_depth:
+                stats.max_depth = cost
 
-                if new_pos is None:
-                    continue
+            # Check if the current node is the goal node
+            if current_node == goal_node:
+                self.end_search(stats, i)
+                yield SearchProgress(stats, self.reconstruct_path(parents, current_node), True)
+                return
 
-                # Check if the new node is already in the closed list
-                if new_node in closed_list:
+            # Expand the current node
+            stats.nodes_expanded += 1
+            if stats.nodes_expanded == next_report:
+                next_report = self.report_progress(stats, i)
+            if stats.nodes_expanded == next_slice:
+                next_slice += slice_size
+                yield self.search_progress(stats, i)
+            for direction in DIRECTIONS:
+                new_node = slide(current_node, direction, occupied)
+                i += 1
+                if new_node == current_node or distances[new_node] is None:
                     continue
-
-                # Add the new node to the open list with the combined cost
-                open_list.append(new_node)
-
-                # Set the parent node for the new node
-                parents[node_number] = (direction, current_node[1])
-                node_number += 1
-                
-            # Add the current node to the closed list
-            closed_list.add(current_node)
-
-        return None  # No path found
+                if new_node not in g_costs or cost + 1 < g_costs[new_node]:
+                    g_costs[new_node] = cost + 1
+                    parents[new_node] = (current_node, direction)
+                    heapq.heappush(open_list, (cost + 1 + distances[new_node], cost + 1, new_node))
+                else:
+                    stats.duplicate_hits += 1
+
+        self.end_search(stats, i)
+        yield SearchProgress(stats, None, True)  # No path found
     
-    # function to reconstruct the path when it finds a solution for our AI
-    def reconstruct_path(self,parents, direction, current_node):
-        sorted_dict = dict(sorted(parents.items()))
-        previous_value = None
-        previous_value2 = None
+    # function to reconstruct the path when it finds a solution for our AI, following the parent links back from the goal node
+    def reconstruct_path(self, parents, current_node):
         path = []
-        for value in sorted_dict.values():
-            if value[0] != previous_value and value[1] != previous_value2:
-                path.append(value)
-            previous_value = value[0]
-            previous_value2 = value[1]
-        path.append((direction, current_node))  # add goal node to the path
-        print("States generated: ",len(path))
-        return path                 
-    
-    def calculate_combined_cost(self, node, goal_node):
-        actual_cost = self.calculate_actual_cost(node[1], goal_node)
-        heuristic = self.calculate_heuristic(node[1], goal_node)
-        return actual_cost + heuristic
-
-    def calculate_actual_cost(self, current_pos, new_pos):
-        # Calculate the actual cost from the current position to the new position
-        actual_cost = abs(current_pos[0] - new_pos[0]) + abs(current_pos[1] - new_pos[1])
-        return actual_cost
-
-    def calculate_heuristic(self, node, goal_node):
-        # Calculate the heuristic estimate (Manhattan distance) of the cost from the node to the goal node
-        heuristic = abs(node[0] - goal_node[0]) + abs(node[1] - goal_node[1])
-        return heuristic
+        while parents[current_node] is not None:
+            parent, direction = parents[current_node]
+            path.append((direction, divmod(current_node, self.size)))
+            current_node = parent
+        path.reverse()
+        return path
 
     # function to move other robots (non-main one) and then saved it in the intial positions (as well as the colored_robots) for our AI
     def move_robot2(self, robot, direction):
         if not self.game_over:
             x, y = self.initial_positions[robot][:2]
-            if direction == 'up':
-                while x > 0 and (x-1, y) not in self.walls and not self.check_collision(robot, (x - 1, y)):
-                    x -= 1
-            elif direction == 'down':
-                while x < self.size -1 and (x + 1, y) not in self.walls and not self.check_collision(robot, (x + 1, y)):
-                    x += 1
-            elif direction == 'left':
-                while y > 0 and (x, y - 1) not in self.walls and not self.check_collision(robot, (x, y - 1)):
-                    y -= 1
-            elif direction == 'right':
-                while y < self.size - 1 and (x, y + 1) not in self.walls and not self.check_collision(robot, (x, y + 1)):
-                    y += 1
+            occupied = self.other_robot_cells(robot, self.initial_positions)
+            x, y = divmod(self.slide(x * self.size + y, direction, occupied), self.size)
             
             color = self.colored_robots[robot][2]  # take the color of the robot
             self.initial_positions[robot] = (x, y, color)
@@ -515,9 +1720,9 @@ class RicochetRobots:
         for robot_id, (_, _, color) in self.initial_positions.items():
             if color == self.target_color:
                 target_robot_id = robot_id
-        new_choices = [x for x in [0,1,2,3] if x != target_robot_id]
-        robot = random.choice(new_choices)
-        direction = random.choice(['up','down','right','left'])
+        new_choices = [x for x in self.initial_positions if x != target_robot_id]
+        robot = self.rng.choice(new_choices)
+        direction = self.rng.choice(['up','down','right','left'])
         self.move_robot2(robot, direction)
     
         # see if that configuration of initial positions have been sees before. For that, all the initial positions will be save in self.already_visited
@@ -528,63 +1733,350 @@ class RicochetRobots:
             self.change_robot()
         
     
+# a session of many rounds on the same walls, like a real game of Ricochet Robots: every round has a new target and the
+# robots start where the previous round left them. What only depends on the walls is built once for the whole session:
+# the stop table, the lower bounds of the targets (given up front with targets, or at their first round), the distance maps
+# of target_distances (kept by target and blockers) and the cells the robots can reach in prove_unsolvable (kept by cells of
+# the robots). A new target or moved robots only compute the maps of the new target or blockers, and only changing the
+# walls (add_walls, ...) throws everything away
+class GameSession:
+    def __init__(self, game, targets=()):
+        self.game = game
+        self.rounds = []  # (target, target color, path) of the rounds played, path is None for a round without solution
+        game.build_stop_table()
+        for cell in targets:
+            game.lower_bound_distances(cell)
+
+    # start a new round with the target on cell (x, y) and the given color. The robots stay where they are
+    def start_round(self, cell, color):
+        game = self.game
+        robots = [game.robots[robot_id] + (game.colored_robots[robot_id][2],) for robot_id in sorted(game.robots)]
+        game.initial_positions = {}
+        game.already_visited = [[]]
+        game.place_robots(robots)
+        game.place_target(cell, color)
+        game.selected_robot = None
+        game.game_over = any((x, y) == game.target and c == game.target_color for x, y, c in robots)
+
+    # solve the round with solver (the name of a RicochetRobots solver) and move the robots along the solution, so the next
+    # round starts where they stop. Returns the path (None when the round has no solution, the robots then stay)
+    def solve(self, solver='multi_robot_bfs'):
+        path = getattr(self.game, solver)()
+        if path is not None:
+            self.play(path)
+        self.rounds.append((self.game.target, self.game.target_color, path))
+        return path
+
+    # move the robots along path: (robot_id, direction, new_pos) moves, or the (direction, new_pos) moves of the robot with
+    # the target color of the single-robot solvers
+    def play(self, path):
+        game = self.game
+        target_robot = next(robot_id for robot_id, (_, _, color) in game.initial_positions.items() if color == game.target_color)
+        for step in path:
+            robot_id = step[0] if len(step) == 3 else target_robot
+            x, y = step[-1]
+            game.robots[robot_id] = (x, y)
+            game.colored_robots[robot_id] = (x, y, game.colored_robots[robot_id][2])
+        game.game_over = True
+
+    # move a robot by hand (like the arrow keys of main)
+    def move(self, robot_id, direction):
+        self.game.selected_robot = robot_id
+        self.game.move_robot(direction)
+
+
+# solves the board of game in a worker thread, so the caller (the pygame loop of main) keeps handling events and drawing.
+# The solvers (names of RicochetRobots methods) are tried in order until one finds a solution, after checking that the board
+# is not one that prove_unsolvable rejects without searching. The search is stopped when
+# cancel() is called or after time_budget seconds (None for no limit), through the cancel token of the game
+class BackgroundSolve:
+    def __init__(self, game, solvers, time_budget=None):
+        self.game = game
+        self.solvers = solvers
+        self.token = CancelToken(None if time_budget is None else time.monotonic() + time_budget)
+        self.path = None  # solution found (None if none was found)
+        self.solver = None  # solver that found it
+        self.reason = None  # why the board has no solution, when game.prove_unsolvable found it before searching
+        self.cancelled = False  # True if the search was stopped by cancel() or by the time budget
+        self.error = None  # exception raised by a solver, if any
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.game.cancel_token = self.token
+        try:
+            self.reason = self.game.prove_unsolvable()
+            if self.reason is not None:
+                return
+            for solver in self.solvers:
+                self.path = getattr(self.game, solver)()
+                if self.path is not None:
+                    self.solver = solver
+                    break
+                if self.game.verbose and solver != self.solvers[-1]:
+                    print("Solution not found with %s, I will try %s" % (solver, self.solvers[self.solvers.index(solver) + 1]))
+        except SearchCancelled:
+            self.cancelled = True
+        except Exception as error:
+            self.error = error
+        finally:
+            self.game.cancel_token = None
+
+    def cancel(self):
+        self.token.cancel()
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    # wait for the end of the search (at most timeout seconds) and return the solution. The exception of a solver that
+    # failed is raised again here
+    def result(self, timeout=None):
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.path
+
+
+hint_search = None  # in the worker process of PlayHints: number of its latest search (a shared multiprocessing.Value)
+hint_board = None  # in the worker process of PlayHints: board of the last layout of walls, which keeps its stop table
+
+
+def start_hint_worker(search):
+    global hint_search
+    hint_search = search
+
+
+# cancel token of the searches of the worker process of PlayHints: a search also stops once PlayHints has started a newer one
+class HintToken(CancelToken):
+    def __init__(self, deadline, search):
+        super().__init__(deadline)
+        self.search = search
+
+    def should_stop(self):
+        return hint_search.value != self.search or super().should_stop()
+
+
+# solve the robots on positions in the worker process of PlayHints (see PlayHints.submit for job). Returns the
+# (robot_id, direction, new_pos) moves, None without solution, and raises SearchCancelled if a newer search has started
+def solve_hint(job, positions):
+    global hint_board
+    if hint_board is None or (hint_board.size, bytes(hint_board.cell_walls)) != (job['size'], job['cell_walls']):
+        hint_board = RicochetRobots(job['size'])
+        hint_board.set_cell_walls(job['cell_walls'])
+        hint_board.build_stop_table()
+        hint_board.verbose = False
+    board = hint_board
+    board.robots, board.colored_robots, board.initial_positions = {}, {}, {}
+    board.already_visited = [[]]
+    board.place_robots([position + (color,) for position, color in zip(positions, job['colors'])])
+    board.place_target(job['target'], job['target_color'])
+    deadline = job['deadline']  # a time.time(), which the processes share
+    board.cancel_token = HintToken(None if deadline is None else time.monotonic() + deadline - time.time(), job['search'])
+    try:
+        return None if board.prove_unsolvable() is not None else getattr(board, job['solver'])()
+    finally:
+        board.cancel_token = None
+
+
+# hints for the player of main: the best next move and the number of moves left from where the robots are now. An optimal
+# joint solution (solver is multi_robot_bfs or ida_star) from the positions of the robots is searched in a worker process,
+# so the searches do not take the GIL from the loop of the game. Every position along a solution gets its remaining moves
+# at once, so a player following the hints never waits. Then the worker also solves the positions one move away, so most
+# moves off the solution are answered at once too. Only a position that is not known yet starts a new search (moved) and,
+# until it ends, hint falls back on the distance map of the robots with the target color moving alone (one lookup, a BFS
+# over the cells at worst, so it fits in a frame). A search is stopped after time_budget seconds
+class PlayHints:
+    def __init__(self, game, solver='multi_robot_bfs', time_budget=TIME_BUDGET):
+        self.game = game
+        self.solver = solver
+        self.time_budget = time_budget
+        self.solutions = {}  # positions of the robots (by robot id) -> optimal moves left from there (None if no solution)
+        self.start = self.positions()
+        self.searched = None  # positions of the latest search
+        self.futures = []  # Futures of the jobs of the latest search
+        if game.stop_table is None:
+            game.build_stop_table()
+        context = multiprocessing.get_context('spawn')
+        self.latest = context.Value('i', 0)  # number of the latest search, the worker drops the older ones
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=start_hint_worker,
+                                            initargs=(self.latest,))
+        self.search()
+
+    def positions(self):
+        return tuple(self.game.robots[robot_id] for robot_id in sorted(self.game.robots))
+
+    # moves of the optimal solution from the positions at the start (None until the first search is done or without solution)
+    def optimal_moves(self):
+        path = self.solutions.get(self.start)
+        return None if path is None else len(path)
+
+    # to call after every move of the player: starts a new search if the robots are now on positions that are not known yet
+    def moved(self):
+        positions = self.positions()
+        if positions not in self.solutions and positions != self.searched:
+            self.search()
+
+    # (robot_id, direction, moves left, exact) for the current positions. exact is False for the fallback of a robot with
+    # the target color moving alone (moves left is then the fewest moves of such a solution). None when there is no hint
+    def hint(self):
+        game = self.game
+        positions = self.positions()
+        if positions in self.solutions:
+            path = self.solutions[positions]
+            if not path:
+                return None
+            robot_id, direction, _ = path[0]
+            return robot_id, direction, len(path), True
+        size = game.size
+        best = None
+        for robot_id, (x, y, color) in game.colored_robots.items():
+            if color != game.target_color:
+                continue
+            occupied = game.other_robot_cells(robot_id, game.robots)
+            distances = game.target_distances(occupied)
+            moves = distances[x * size + y]
+            if not moves or (best is not None and moves >= best[2]):
+                continue
+            for direction in DIRECTIONS:
+                if distances[game.slide(x * size + y, direction, occupied)] == moves - 1:
+                    best = (robot_id, direction, moves, False)
+                    break
+        return best
+
+    # search the current positions in the worker process (the previous search is stopped)
+    def search(self):
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        with self.latest.get_lock():
+            self.latest.value += 1
+        self.searched = self.positions()
+        self.submit(self.searched, self.latest.value, True)
+
+    def cancel(self):
+        with self.latest.get_lock():
+            self.latest.value += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # send the positions of the search number search to the worker (and then their neighbours, see solved)
+    def submit(self, positions, search, neighbours=False):
+        game = self.game
+        job = {
+            'size': game.size,
+            'cell_walls': bytes(game.cell_walls),
+            'colors': [game.colored_robots[robot_id][2] for robot_id in sorted(game.colored_robots)],
+            'target': game.target,
+            'target_color': game.target_color,
+            'solver': self.solver,
+            'deadline': None if self.time_budget is None else time.time() + self.time_budget,
+            'search': search,
+        }
+        try:
+            future = self.executor.submit(solve_hint, job, positions)
+        except RuntimeError:  # cancel() has shut the worker down
+            return
+        self.futures.append(future)
+        future.add_done_callback(functools.partial(self.solved, positions, search, neighbours))
+
+    # called (in a thread of the executor) when the worker has solved positions: keeps the moves left from every position
+    # along the solution and, for the positions of a search, sends the positions one move away by any robot
+    def solved(self, positions, search, neighbours, future):
+        if future.cancelled() or future.exception() is not None:  # a newer search started (SearchCancelled) or it failed
+            return
+        path = future.result()
+        if path is None:
+            self.solutions[positions] = None
+        else:
+            moved = positions
+            for i, (robot_id, _, cell) in enumerate(path):
+                self.solutions.setdefault(moved, path[i:])
+                moved = moved[:robot_id] + (cell,) + moved[robot_id + 1:]
+            self.solutions.setdefault(moved, [])
+        if not neighbours or search != self.latest.value:
+            return
+        size = self.game.size
+        for robot_id in range(len(positions)):
+            x, y = positions[robot_id]
+            occupied = [px * size + py for i, (px, py) in enumerate(positions) if i != robot_id]
+            for direction in DIRECTIONS:
+                cell = divmod(self.game.slide(x * size + y, direction, occupied), size)
+                neighbour = positions[:robot_id] + (cell,) + positions[robot_id + 1:]
+                if neighbour not in self.solutions:
+                    self.submit(neighbour, search)
+
+
 def main():
+    import pygame
+    from solution_cache import SolutionCache
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Ricochet Robots")
     game = RicochetRobots()
+    game.solution_cache = SolutionCache(CACHE_FILE)  # a board that has already been solved is not searched again
 
     # Change the next 3 lines to select different levels (existing levels: random, 1, 2, 3, 4)
     game.place_walls_4()
     game.place_robots_4()
     game.place_target_4()
+    #game.place_solvable_random(5, 10) # instead of the 3 lines: a random board with an optimal solution of 5 to 10 moves
+    game.build_stop_table()
 
+    grid = game.cell_size(screen)  # pixels of a cell
     clock = pygame.time.Clock()
-    screen.fill(WHITE)
-    game.draw_board(screen)
+    game.draw_board(screen, full=True)
     pygame.display.flip()
     clock.tick(60)
-    font = pygame.font.Font(None, 36)
+    font = pygame.font.Font(None, max(10, grid * 6 // 5))  # numbers of the moves of the AI, 36 with 30 pixel cells
     User_play = False # Change to True if you want the User to play
+    Show_hints = True # with User_play, the best next move and the moves left are shown in the title of the window
     AI_play = True # Change to True if you want the AI to play
     start_time = time.time_ns()
 
-    # AI is playing
+    # AI is playing: the board is solved in a worker thread while this loop keeps the window alive, and the search is stopped
+    # after TIME_BUDGET seconds or when the window is closed
+    if AI_play:
+        # if a path is not found moving only the robot with the target color, it searches the joint positions of all the
+        # robots (any robot can move), which gives a minimal solution or proves that the board has no solution
+        solve = BackgroundSolve(game, ['dfs', 'multi_robot_bfs'], TIME_BUDGET) # DFS algorithm
+        #solve = BackgroundSolve(game, ['bfs', 'multi_robot_bfs'], TIME_BUDGET) # BFS algorithm
+        #solve = BackgroundSolve(game, ['bidirectional_bfs', 'multi_robot_bfs'], TIME_BUDGET) # bidirectional BFS algorithm
+        #solve = BackgroundSolve(game, ['A_star', 'multi_robot_bfs'], TIME_BUDGET) # A* algorithm
+        #solve = BackgroundSolve(game, ['greedy_best_first_search', 'multi_robot_bfs'], TIME_BUDGET) # GBFS algorithm
     while AI_play:
-        path = game.dfs() # DFS algorithm
-        #path = game.bfs() # BFS algorithm
-        #path = game.A_star() # A* algorithm
-        #path = game.greedy_best_first_search() # GBFS algorithm
-        if path is not None:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                solve.cancel()
+        pygame.display.update(game.draw_board(screen))
+        clock.tick(60)
+        if not solve.done():
+            continue
+        AI_play = False
+        path = solve.result()
+        if solve.cancelled:
+            print("The search was stopped before finding a solution")
+        elif path is not None:
             end_time = time.time_ns()
             elapsed_time = end_time - start_time
             print("Time taken to find a solution:", elapsed_time, "nanoseconds")
-            AI_play = False
             i = 0
-            # Draw the path on the screen
-            for direction, pos in path:
-                pygame.draw.circle(screen, BLACK, (pos[1] * GRID_SIZE + GRID_SIZE // 2, pos[0] * GRID_SIZE + GRID_SIZE // 2), GRID_SIZE // 2)
+            # Draw the path on the screen (the moves of multi_robot_bfs also say which robot is moved)
+            for step in path:
+                pos = step[-1]
+                pygame.draw.circle(screen, BLACK, (pos[1] * grid + grid // 2, pos[0] * grid + grid // 2), max(1, grid // 2))
                 i += 1
                 text_surface = font.render(str(i), True, RED)
-                text_rect = text_surface.get_rect(center=(pos[1] * GRID_SIZE + GRID_SIZE // 2, pos[0] * GRID_SIZE + GRID_SIZE // 2))
+                text_rect = text_surface.get_rect(center=(pos[1] * grid + grid // 2, pos[0] * grid + grid // 2))
                 screen.blit(text_surface, text_rect)
                 pygame.display.flip()
                 pygame.time.delay(1000)
-            
+        elif solve.reason is not None:
+            print("This board does not contain a valid solution:", solve.reason)
         else:
-            # if a path has not been found, it calls game.change_robot() that will moves other robots (non-main one) and start looking for a solution again
-            print("Solution not found, I will try to move other robots")
-            game.change_robot()   
-            clock = pygame.time.Clock()
-            screen.fill(WHITE)
-            game.draw_board(screen)
-            pygame.display.flip()
-            passed_time = time.time_ns()-start_time
-            if passed_time>300000000000:
-                print("I did not find any solution in the past 5 minutes")
-                AI_play = False
+            print("This board does not contain a valid solution")
 
     moves = 0
+    hints = PlayHints(game) if User_play and Show_hints else None
+    shown_hint = None
     # User is playing
     while User_play:
         for event in pygame.event.get():
@@ -605,13 +2097,22 @@ def main():
                     moves += 1
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
-                grid_pos = (mouse_pos[1] // GRID_SIZE, mouse_pos[0] // GRID_SIZE)
+                grid_pos = (mouse_pos[1] // grid, mouse_pos[0] // grid)
                 for robot_id, robot_pos in game.robots.items():
                     if robot_pos == grid_pos:
                         game.selected_robot = robot_id
-        screen.fill(WHITE)
-        game.draw_board(screen)
-        pygame.display.flip()
+        if hints is not None:
+            hints.moved()
+            hint = hints.hint()
+            if hint != shown_hint:
+                shown_hint = hint
+                caption = "Ricochet Robots"
+                if hint is not None:
+                    robot_id, direction, moves_left, exact = hint
+                    x, y = game.robots[robot_id]
+                    caption += " - hint: robot at row %d, column %d %s, %s%d moves left" % (x, y, direction, '' if exact else 'at most ', moves_left)
+                pygame.display.set_caption(caption)
+        pygame.display.update(game.draw_board(screen))
         clock.tick(60)
 
         if game.game_over: 
@@ -621,10 +2122,19 @@ def main():
             text = font.render("You Win!", True, BLACK)
             print("User takes ",moves, "moves to find a solution")
             screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - text.get_height() // 2))
+            if hints is not None:
+                hints.cancel()
+                optimal = hints.optimal_moves()
+                if optimal is not None:
+                    print("The optimal solution has", optimal, "moves, the user took", moves - optimal, "more")
+                    text = font.render("%d moves, optimal %d" % (moves, optimal), True, BLACK)
+                    screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 + text.get_height()))
             pygame.display.flip()
             pygame.time.wait(5000)
             break
 
+    if hints is not None:
+        hints.cancel()  # the window was closed: the worker process stops its search
     pygame.time.wait(5000) # visualization time before closing the game
     pygame.quit()
 
@@ -0,0 +1,140 @@
+# Headless batch solving: spreads many boards (the levels 1-4 and seeded random boards) over a pool of processes
+# and streams back one result per board. Example: python batch.py --random 1000 --solver bfs
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+import time
+
+from Ricochet import NUM_ROBOTS, SOLVERS, RicochetRobots
+from levels import LevelCorpus
+from solution_cache import SolutionCache
+
+LEVELS = [1, 2, 3, 4]
+
+# boards already built by this worker process, so the walls and the tables of a level are only computed once per worker
+worker_boards = {}
+worker_cache = None  # SolutionCache of this worker process, if the boards are solved with a cache
+corpora = {}  # level corpora opened by this process (path -> LevelCorpus)
+
+
+# build the board described by board: ('level', n) for the levels 1-4, ('random', seed) for a seeded random board (or
+# ('random', seed, size, number of robots) for another size than 16x16 with 4 robots) or ('corpus', path, i) for the board
+# i of a level corpus (see levels.py)
+def build_board(board):
+    kind, value = board[0], board[1]
+    if kind == 'corpus':
+        if value not in corpora:
+            corpora[value] = LevelCorpus(value)
+        game = corpora[value][board[2]]
+    elif kind == 'level':
+        game = RicochetRobots()
+        getattr(game, 'place_walls_%d' % value)()
+        getattr(game, 'place_robots_%d' % value)()
+        getattr(game, 'place_target_%d' % value)()
+    elif kind == 'random':
+        size, num_robots = board[2:4] if len(board) > 2 else (16, NUM_ROBOTS)
+        game = RicochetRobots(size, seed=value, num_robots=num_robots)
+        game.place_walls_random()
+        game.place_target_random()
+        game.place_robots_random()
+    else:
+        raise ValueError("unknown board kind: %r" % (kind,))
+    game.build_stop_table()
+    return game
+
+
+# runs once in every worker: opens the solution cache (the file cache_path is shared by all the workers) and builds the
+# levels before the first board arrives
+def warm_up_worker(cache_path=None):
+    global worker_cache
+    if cache_path is not None:
+        worker_cache = SolutionCache(cache_path)
+    for level in LEVELS:
+        worker_boards[('level', level)] = build_board(('level', level))
+
+
+# board of this worker ready for a new search. The levels are reused between boards (the walls and the stop and distance
+# tables do not change, only the robots moved by the previous search are put back), random boards are built every time
+def worker_board(board):
+    game = worker_boards.get(board)
+    if game is None:
+        game = build_board(board)
+        game.solution_cache = worker_cache
+        game.verbose = False  # the number of states printed by the solvers would be mixed with the results
+        return game
+    game.solution_cache = worker_cache
+    game.verbose = False
+    game.robots = {robot_id: (x, y) for robot_id, (x, y, _) in game.initial_positions.items()}
+    game.colored_robots = dict(game.initial_positions)
+    game.game_over = False
+    return game
+
+
+# solve a single board in a worker
+def solve_board(board, solver):
+    game = worker_board(board)
+    start_time = time.perf_counter()
+    path = getattr(game, solver)()
+    elapsed_time = time.perf_counter() - start_time
+    return {
+        'board': list(board),
+        'solver': solver,
+        'path': path,
+        'length': None if path is None else len(path),
+        'states': game.stats.nodes_generated,
+        'time': elapsed_time,
+    }
+
+
+# description of a seeded random board (the short one for the default size and number of robots)
+def random_board(seed, size=16, num_robots=NUM_ROBOTS):
+    if (size, num_robots) == (16, NUM_ROBOTS):
+        return ('random', seed)
+    return ('random', seed, size, num_robots)
+
+
+def solve_chunk(boards, solver):
+    return [solve_board(board, solver) for board in boards]
+
+
+# solve every board of boards with the given solver over a pool of workers processes (all the cores by default). The boards
+# are sent in chunks of chunksize and the results (dicts with board, solver, path, length, states and time) are yielded as
+# soon as their chunk is done, in no particular order. With cache_path, the workers share a solution cache in that file
+def solve_boards(boards, solver='bfs', workers=None, chunksize=16, cache_path=None):
+    if solver not in SOLVERS:
+        raise ValueError("unknown solver: %r" % (solver,))
+    boards = list(boards)
+    chunks = [boards[i:i + chunksize] for i in range(0, len(boards), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=warm_up_worker,
+                             initargs=(cache_path,)) as executor:
+        futures = [executor.submit(solve_chunk, chunk, solver) for chunk in chunks]
+        for future in as_completed(futures):
+            for result in future.result():
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve many Ricochet Robots boards in parallel")
+    parser.add_argument('--solver', default='bfs', choices=SOLVERS)
+    parser.add_argument('--levels', action='store_true', help="solve the levels 1-4")
+    parser.add_argument('--random', type=int, default=0, help="number of seeded random boards to solve")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first random board")
+    parser.add_argument('--size', type=int, default=16, help="size of the random boards")
+    parser.add_argument('--robots', type=int, default=NUM_ROBOTS, help="number of robots of the random boards")
+    parser.add_argument('--corpus', help="level corpus (see levels.py) whose boards are solved too")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=16)
+    parser.add_argument('--cache', help="sqlite file of a solution cache shared by the workers")
+    args = parser.parse_args()
+
+    boards = [('level', level) for level in LEVELS] if args.levels else []
+    boards += [random_board(seed, args.size, args.robots) for seed in range(args.seed, args.seed + args.random)]
+    if args.corpus:
+        boards += [('corpus', args.corpus, index) for index in range(len(LevelCorpus(args.corpus)))]
+    for result in solve_boards(boards, args.solver, args.workers, args.chunksize, args.cache):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Reproducible benchmark of the solvers: runs every solver of Ricochet.SOLVERS over the levels 1-4 and a corpus of seeded
+# random boards, writes a JSON report and compares it with a saved baseline. Example:
+#   python benchmark.py --output report.json                        (first run, keep report.json as the baseline)
+#   python benchmark.py --output new.json --baseline report.json    (exit code 1 if a solver got slower or worse)
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from Ricochet import NUM_ROBOTS, SOLVERS, SearchStats
+from batch import LEVELS, build_board, random_board
+from levels import LevelCorpus
+
+RANDOM_SEEDS = range(1000, 1020)  # seeds of the random boards of the default corpus
+TIME_LIMIT = 60  # seconds given to one solver on one board
+TIME_TOLERANCE = 0.25  # a solve is slower when it takes 25% more than in the baseline...
+TIME_MARGIN = 0.005  # ... and at least 5 ms more (timings below that are mostly noise)
+
+
+# runs in a new process, so the peak RSS only belongs to this solve. Sends the measures back through connection. With
+# profile, the time of the move generation and of the rest of the search is measured too (the solve gets slower)
+def run_solver(board, solver, connection, profile=False):
+    game = build_board(board)
+    game.verbose = False
+    game.profile = profile
+    start_time = time.perf_counter()
+    path = getattr(game, solver)()
+    elapsed_time = time.perf_counter() - start_time
+    result = {
+        'status': 'solved' if path is not None else 'no solution',
+        'time': elapsed_time,
+        'length': None if path is None else len(path),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    result.update(game.stats.as_dict())
+    connection.send(result)
+    connection.close()
+
+
+# measure one solver on one board, in its own process and with a time limit
+def measure(board, solver, time_limit=TIME_LIMIT, profile=False):
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_solver, args=(board, solver, sender, profile))
+    process.start()
+    sender.close()
+    result = {'status': 'timeout', 'time': None, 'length': None, 'peak_rss_kb': None}
+    result.update(dict.fromkeys(SearchStats().as_dict()))
+    if receiver.poll(time_limit):
+        try:
+            result = receiver.recv()
+        except EOFError:  # the solver raised (e.g. numpy_bfs without NumPy), its traceback is on stderr
+            result['status'] = 'error'
+    else:
+        process.terminate()
+    process.join()
+    result.update({'board': list(board), 'solver': solver})
+    return result
+
+
+# corpus is the path of a level corpus (see levels.py) whose boards are added to the levels and the random boards
+# size and num_robots are those of the random boards
+def run_benchmark(solvers=SOLVERS, seeds=RANDOM_SEEDS, time_limit=TIME_LIMIT, corpus=None, profile=False, size=16,
+                  num_robots=NUM_ROBOTS):
+    boards = [('level', level) for level in LEVELS] + [random_board(seed, size, num_robots) for seed in seeds]
+    if corpus is not None:
+        boards += [('corpus', corpus, index) for index in range(len(LevelCorpus(corpus)))]
+    results = []
+    for solver in solvers:
+        for board in boards:
+            result = measure(board, solver, time_limit, profile)
+            print("%-26s %-14s %-12s time=%s length=%s expanded=%s" % (solver, ' '.join(map(str, board)), result['status'],
+                  result['time'], result['length'], result['nodes_expanded']), file=sys.stderr)
+            results.append(result)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time_limit': time_limit,
+        'profile': profile,
+        'results': results,
+    }
+
+
+# list of the differences of report with baseline that are regressions: slower solves (see TIME_TOLERANCE and TIME_MARGIN),
+# more expanded nodes, longer solutions or boards that are no longer solved
+def compare(report, baseline):
+    previous = {(tuple(result['board']), result['solver']): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        name = "%s on %s" % (result['solver'], ' '.join(map(str, result['board'])))
+        old = previous.get((tuple(result['board']), result['solver']))
+        if old is None:
+            continue
+        if old['status'] not in ('timeout', 'error') and result['status'] in ('timeout', 'error'):
+            regressions.append("%s: %s (was %s)" % (name, result['status'], old['status']))
+            continue
+        if old['status'] in ('timeout', 'error') or result['status'] in ('timeout', 'error'):
+            continue
+        if old['status'] == 'solved' and result['status'] != 'solved':
+            regressions.append("%s: %s (was solved)" % (name, result['status']))
+        if result['time'] > old['time'] * (1 + TIME_TOLERANCE) and result['time'] - old['time'] > TIME_MARGIN:
+            regressions.append("%s: time %.4fs (was %.4fs)" % (name, result['time'], old['time']))
+        if result['nodes_expanded'] > old['nodes_expanded']:
+            regressions.append("%s: %d nodes expanded (was %d)" % (name, result['nodes_expanded'], old['nodes_expanded']))
+        if old['length'] is not None and result['length'] is not None and result['length'] > old['length']:
+            regressions.append("%s: solution of %d moves (was %d)" % (name, result['length'], old['length']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Ricochet Robots solvers")
+    parser.add_argument('--output', default='benchmark.json', help="file where the JSON report is written")
+    parser.add_argument('--baseline', help="report of a previous run to compare with")
+    parser.add_argument('--solvers', nargs='+', default=SOLVERS, choices=SOLVERS)
+    parser.add_argument('--random', type=int, default=len(RANDOM_SEEDS), help="number of seeded random boards")
+    parser.add_argument('--seed', type=int, default=RANDOM_SEEDS.start, help="seed of the first random board")
+    parser.add_argument('--size', type=int, default=16, help="size of the random boards")
+    parser.add_argument('--robots', type=int, default=NUM_ROBOTS, help="number of robots of the random boards")
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help="seconds per solver and board")
+    parser.add_argument('--corpus', help="level corpus (see levels.py) whose boards are benchmarked too")
+    parser.add_argument('--profile', action='store_true',
+                        help="also measure the time of the move generation (slower, do not compare with a normal run)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.solvers, range(args.seed, args.seed + args.random), args.time_limit, args.corpus,
+                           args.profile, args.size, args.robots)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
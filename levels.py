@@ -0,0 +1,261 @@
+# Level files: a compact binary format for corpora of many boards, read through a memory map, and a text format to write
+# levels by hand. Examples:
+#   python levels.py pack levels.txt corpus.rrl       (text file -> binary corpus)
+#   python levels.py unpack corpus.rrl levels.txt     (binary corpus -> text file)
+#   python levels.py random 100000 corpus.rrl         (corpus of seeded random boards, see --seed)
+#   python levels.py solvable 100000 corpus.rrl --min 5 --max 8   (boards with an optimal solution of 5 to 8 moves)
+#
+# Binary format: a header (HEADER) followed by fixed-size records, one per board. A record holds the walls as the raw bytes
+# of RicochetRobots.cell_walls (one byte of WALL_BITS / BLOCKED per cell), then the cell (x * size + y, cell_bytes bytes,
+# little endian) and the color (index of Ricochet.robot_color, one byte) of every robot, and then the cell and the color of the
+# target. Corpora of version 1, where the walls were a bitmap of the wall cells (bit x * size + y), can still be read.
+#
+# Text format: one block per board, separated by an empty line. The first line gives the color of the target and the
+# colors of the robots in order, e.g. "target=R robots=RYGB" (the letters of the colors are in COLOR_LETTERS). Then there
+# is a line per row of the board: '.' is an empty cell, '#' a wall, '*' the target ('+' if the target is on a wall) and a
+# letter a robot (lower case for a robot standing on the target). Walls between two cells are given in the first line too,
+# as x,y,direction items separated by ';' (see RicochetRobots.add_edge_walls), e.g. "edges=0,3,right;5,5,down".
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import mmap
+import os
+import struct
+
+from Ricochet import (BLUE, CYAN, GREEN, NUM_ROBOTS, ORANGE, PINK, PURPLE, RED, YELLOW, RicochetRobots, color_index,
+                      robot_color)
+
+MAGIC = b'RRLV'
+VERSION = 2
+HEADER = struct.Struct('<4sBBHB3x')  # magic, version, number of robots, size of the board, bytes per cell
+COLOR_LETTERS = {RED: 'R', BLUE: 'B', YELLOW: 'Y', GREEN: 'G', PURPLE: 'P', ORANGE: 'O', CYAN: 'C', PINK: 'K'}
+LETTER_COLORS = {letter: color for color, letter in COLOR_LETTERS.items()}
+
+
+# layout of the records of a corpus (size of the board, number of robots and version of the format)
+class RecordFormat:
+    def __init__(self, size, num_robots, version=VERSION):
+        self.size = size
+        self.num_robots = num_robots
+        self.version = version
+        self.cell_bytes = 1 if size * size <= 256 else 2
+        self.walls_bytes = size * size if version >= 2 else (size * size + 7) // 8
+        cell = 'B' if self.cell_bytes == 1 else 'H'
+        self.pieces = struct.Struct('<' + (cell + 'B') * (num_robots + 1))  # robots and target: cell and color
+        self.record_size = self.walls_bytes + self.pieces.size
+
+    def header(self):
+        return HEADER.pack(MAGIC, self.version, self.num_robots, self.size, self.cell_bytes)
+
+    # bytes of the record of game (in the current version only)
+    def encode(self, game):
+        size = self.size
+        values = []
+        for robot_id in sorted(game.initial_positions):
+            x, y, color = game.initial_positions[robot_id]
+            values += [x * size + y, color_index(color)]
+        values += [game.target[0] * size + game.target[1], color_index(game.target_color)]
+        return bytes(game.cell_walls) + self.pieces.pack(*values)
+
+    # RicochetRobots with the board of the record starting at offset in data (bytes, mmap, ...)
+    def decode(self, data, offset):
+        size = self.size
+        game = RicochetRobots(size)
+        if self.version >= 2:
+            game.set_cell_walls(data[offset:offset + self.walls_bytes])
+        else:
+            walls = int.from_bytes(data[offset:offset + self.walls_bytes], 'little')
+            cells = []
+            while walls:
+                lowest = walls & -walls
+                cells.append(divmod(lowest.bit_length() - 1, size))
+                walls ^= lowest
+            game.add_walls(cells)
+        values = self.pieces.unpack_from(data, offset + self.walls_bytes)
+        game.place_robots([divmod(values[i], size) + (robot_color(values[i + 1]),) for i in range(0, len(values) - 2, 2)])
+        game.place_target(divmod(values[-2], size), robot_color(values[-1]))
+        return game
+
+
+# write the boards of games to a binary corpus in path. All of them must have the same size and number of robots
+def write_corpus(path, games):
+    record_format = None
+    with open(path, 'wb') as f:
+        for game in games:
+            if record_format is None:
+                record_format = RecordFormat(game.size, len(game.initial_positions))
+                f.write(record_format.header())
+            elif (game.size, len(game.initial_positions)) != (record_format.size, record_format.num_robots):
+                raise ValueError("all the boards of a corpus must have the same size and number of robots")
+            f.write(record_format.encode(game))
+        if record_format is None:
+            f.write(RecordFormat(16, NUM_ROBOTS).header())
+
+
+# binary corpus read through a memory map: corpus[i] builds the RicochetRobots of the board i straight from its record
+class LevelCorpus:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_robots, size, cell_bytes = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            raise ValueError("%s is not a level corpus (versions 1 to %d)" % (path, VERSION))
+        self.format = RecordFormat(size, num_robots, version)
+        if self.format.cell_bytes != cell_bytes:
+            raise ValueError("%s has %d bytes per cell, expected %d" % (path, cell_bytes, self.format.cell_bytes))
+        self.count = (len(self.data) - HEADER.size) // self.format.record_size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count:
+            raise IndexError("board %d out of range" % index)
+        return self.format.decode(self.data, HEADER.size + (index % self.count) * self.format.record_size)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.data.close()
+
+
+# text block of the board of game (see the text format at the top of the file)
+def level_to_text(game):
+    order = sorted(game.initial_positions)
+    if any(color not in COLOR_LETTERS for _, _, color in game.initial_positions.values()):
+        raise ValueError("the text format only has the colors of COLOR_LETTERS, use a binary corpus for more robots")
+    lines = ["target=%s robots=%s" % (COLOR_LETTERS[game.target_color],
+                                      ''.join(COLOR_LETTERS[game.initial_positions[robot_id][2]] for robot_id in order))]
+    edges = game.edge_walls()
+    if edges:
+        lines[0] += " edges=" + ';'.join("%d,%d,%s" % edge for edge in edges)
+    rows = [['.'] * game.size for _ in range(game.size)]
+    for x, y in game.walls:
+        rows[x][y] = '#'
+    rows[game.target[0]][game.target[1]] = '+' if game.target in game.walls else '*'
+    for robot_id in order:
+        x, y, color = game.initial_positions[robot_id]
+        rows[x][y] = COLOR_LETTERS[color].lower() if (x, y) == game.target else COLOR_LETTERS[color]
+    return '\n'.join(lines + [''.join(row) for row in rows]) + '\n'
+
+
+# RicochetRobots of a text block
+def level_from_text(text):
+    lines = [line.strip() for line in text.strip().splitlines()]
+    fields = dict(field.split('=', 1) for field in lines[0].split())
+    robot_letters = fields['robots']
+    if len(set(robot_letters)) != len(robot_letters):
+        raise ValueError("the robots of a text level must have different colors")
+    rows = lines[1:]
+    game = RicochetRobots(len(rows))
+    walls, target, robots = [], None, {}
+    for x, row in enumerate(rows):
+        if len(row) != len(rows):
+            raise ValueError("row %d of the level has %d cells instead of %d" % (x, len(row), len(rows)))
+        for y, char in enumerate(row):
+            if char == '#':
+                walls.append((x, y))
+            elif char == '*':
+                target = (x, y)
+            elif char == '+':
+                walls.append((x, y))
+                target = (x, y)
+            elif char.upper() in LETTER_COLORS:
+                robots[char.upper()] = (x, y)
+                if char.islower():
+                    target = (x, y)
+            elif char != '.':
+                raise ValueError("unknown cell %r in row %d of the level" % (char, x))
+    game.add_walls(walls)
+    if 'edges' in fields:
+        edges = [edge.split(',') for edge in fields['edges'].split(';')]
+        game.add_edge_walls([(int(x), int(y), direction) for x, y, direction in edges])
+    game.place_robots([robots[letter] + (LETTER_COLORS[letter],) for letter in robot_letters])
+    game.place_target(target, LETTER_COLORS[fields['target']])
+    return game
+
+
+def export_text(path, games):
+    with open(path, 'w') as f:
+        f.write('\n'.join(level_to_text(game) for game in games))
+
+
+def import_text(path):
+    with open(path) as f:
+        blocks = f.read().split('\n\n')
+    return [level_from_text(block) for block in blocks if block.strip()]
+
+
+def random_boards(count, seed=0, size=16, num_robots=NUM_ROBOTS):
+    for board_seed in range(seed, seed + count):
+        game = RicochetRobots(size, seed=board_seed, num_robots=num_robots)
+        game.place_walls_random()
+        game.place_target_random()
+        game.place_robots_random()
+        yield game
+
+
+# seeded random board with a solution of min_moves to max_moves moves (see RicochetRobots.place_solvable_random)
+def solvable_board(seed, min_moves=1, max_moves=None, size=16, num_robots=NUM_ROBOTS, exact=True):
+    game = RicochetRobots(size, seed=seed, num_robots=num_robots)
+    game.place_solvable_random(min_moves, max_moves, exact)
+    return game
+
+
+# count solvable boards with the seeds seed, seed + 1, ..., made by workers processes (all the cores if None)
+def solvable_boards(count, seed=0, min_moves=1, max_moves=None, size=16, num_robots=NUM_ROBOTS, exact=True, workers=1):
+    make_board = functools.partial(solvable_board, min_moves=min_moves, max_moves=max_moves, size=size,
+                                   num_robots=num_robots, exact=exact)
+    seeds = range(seed, seed + count)
+    if workers == 1:
+        yield from map(make_board, seeds)
+        return
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        yield from executor.map(make_board, seeds, chunksize=256)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Ricochet Robots level files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help="text levels -> binary corpus")
+    pack.add_argument('text')
+    pack.add_argument('corpus')
+    unpack = commands.add_parser('unpack', help="binary corpus -> text levels")
+    unpack.add_argument('corpus')
+    unpack.add_argument('text')
+    random_corpus = commands.add_parser('random', help="binary corpus of seeded random boards")
+    random_corpus.add_argument('count', type=int)
+    random_corpus.add_argument('corpus')
+    random_corpus.add_argument('--seed', type=int, default=0)
+    random_corpus.add_argument('--size', type=int, default=16)
+    random_corpus.add_argument('--robots', type=int, default=NUM_ROBOTS)
+    solvable = commands.add_parser('solvable', help="binary corpus of seeded boards with a solution in a range of moves")
+    solvable.add_argument('count', type=int)
+    solvable.add_argument('corpus')
+    solvable.add_argument('--seed', type=int, default=0)
+    solvable.add_argument('--min', type=int, default=1, help="fewest moves of the optimal solution")
+    solvable.add_argument('--max', type=int, default=None, help="most moves of the optimal solution")
+    solvable.add_argument('--size', type=int, default=16)
+    solvable.add_argument('--robots', type=int, default=NUM_ROBOTS)
+    solvable.add_argument('--inexact', action='store_true',
+                          help="the range is for the robot with the target color alone (faster for long solutions)")
+    solvable.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        write_corpus(args.corpus, import_text(args.text))
+    elif args.command == 'unpack':
+        corpus = LevelCorpus(args.corpus)
+        export_text(args.text, corpus)
+        corpus.close()
+    elif args.command == 'random':
+        write_corpus(args.corpus, random_boards(args.count, args.seed, args.size, args.robots))
+    else:
+        write_corpus(args.corpus, solvable_boards(args.count, args.seed, args.min, args.max, args.size, args.robots,
+                                                  not args.inexact, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Cache of the solutions found by the solvers, keyed by a fingerprint of the board (walls, target and robots) and the name of
+# the solver. Recently used solutions are kept in memory (LRU) and, if a file is given, all of them are also
+# kept in a sqlite database that is shared between runs and processes. Boards without a solution are cached too (as None).
+# To use it: game.solution_cache = SolutionCache('solutions.db')
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+# ids of the robots of game in a canonical order: the robots with the target color, then the others, each group by cell. The
+# other robots are only blockers, so boards that only differ by their colors or by which robot has which id have the same
+# solutions (see RicochetRobots.canonical_order)
+def canonical_robots(game):
+    positions = game.initial_positions
+    return sorted(positions, key=lambda robot_id: (positions[robot_id][2] != game.target_color, positions[robot_id][:2]))
+
+
+# canonical hash of everything a solver result depends on
+def board_fingerprint(game, solver):
+    robots = [[x, y, color == game.target_color] for x, y, color in map(game.initial_positions.get, canonical_robots(game))]
+    board = [solver, game.size, game.cell_walls.hex(), game.target, robots]
+    return hashlib.sha1(json.dumps(board).encode()).hexdigest()
+
+
+# the moves of the joint solvers, (robot_id, direction, new_pos), are stored with the rank of the robot in canonical_robots
+# instead of its id, which is not the same on all the boards with a fingerprint
+def path_to_ranks(path, order):
+    if path is None:
+        return None
+    ranks = {robot_id: rank for rank, robot_id in enumerate(order)}
+    return [(ranks[step[0]],) + tuple(step[1:]) if len(step) == 3 else step for step in path]
+
+
+def path_from_ranks(path, order):
+    if path is None:
+        return None
+    return [(order[step[0]],) + tuple(step[1:]) if len(step) == 3 else step for step in path]
+
+
+# the paths are stored as JSON, which turns their tuples into lists
+def decode_path(path):
+    if path is None:
+        return None
+    return [tuple(step[:-1]) + (tuple(step[-1]),) for step in path]
+
+
+class SolutionCache:
+    # memory_size and disk_size are the maximum number of solutions kept in memory and in the database file (the least
+    # recently used ones are removed first). Without path only the memory is used
+    def __init__(self, path=None, memory_size=1024, disk_size=100000):
+        self.memory = OrderedDict()  # key -> path (None for a board without solution)
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.db = None
+        self.lock = threading.Lock()  # the solvers can run in another thread than the one that opened the cache
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")  # the workers of batch.py read and write it at the same time
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, path TEXT, used REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+            self.disk_rows = self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    # (True, path) if the result of solver for this board is known, (False, None) otherwise
+    def lookup(self, game, solver):
+        key = board_fingerprint(game, solver)
+        with self.lock:
+            found, path = self.lookup_key(key)
+        return found, path_from_ranks(path, canonical_robots(game))
+
+    def lookup_key(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return True, self.memory[key]
+        if self.db is not None:
+            row = self.db.execute("SELECT path FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), key))
+                path = decode_path(json.loads(row[0]))
+                self.remember(key, path)
+                return True, path
+        return False, None
+
+    # keep the result of solver for this board (path is None when the board has no solution)
+    def store(self, game, solver, path):
+        key = board_fingerprint(game, solver)
+        with self.lock:
+            self.store_key(key, path_to_ranks(path, canonical_robots(game)))
+
+    def store_key(self, key, path):
+        self.remember(key, path)
+        if self.db is not None:
+            values = (json.dumps(path), time.time(), key)
+            if self.db.execute("UPDATE solutions SET path = ?, used = ? WHERE key = ?", values).rowcount == 0:
+                self.db.execute("INSERT OR REPLACE INTO solutions (path, used, key) VALUES (?, ?, ?)", values)
+                self.disk_rows += 1
+            if self.disk_rows > self.disk_size:
+                self.evict()
+
+    def remember(self, key, path):
+        self.memory[key] = path
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    # remove the least recently used tenth of the database (other processes may have added rows, so they are counted again)
+    def evict(self):
+        self.disk_rows = self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        extra = self.disk_rows - self.disk_size + self.disk_size // 10
+        if extra > 0:
+            self.db.execute("DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY used LIMIT ?)", (extra,))
+            self.disk_rows -= extra
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,382 @@
+# Local solve service: the game front-ends send their boards as JSON to this server on localhost instead of solving them
+# in-process, and a pool of worker processes, started once, solves them. Example:
+#   python solve_server.py --port 8765 --workers 4
+#   curl -d '{"text": "target=R robots=RB\n#...\n.R..\n..B.\n...*"}' http://127.0.0.1:8765/solve
+#
+# POST /solve takes a board, either in the text format of levels.py ({"text": "..."}) or as:
+#   {"size": 16,                       (optional, 16 by default)
+#    "walls": [[x, y], ...],           (wall cells, optional)
+#    "edges": [[x, y, "right"], ...],  (walls between two cells, see RicochetRobots.add_edge_walls, optional)
+#    "robots": [[x, y, "R"], ...],     (robots[i] is the robot i, colors are letters of levels.COLOR_LETTERS or indexes
+#                                       of Ricochet.robot_color)
+#    "target": [x, y, "G"]}
+# with two optional fields: "solver" (one of Ricochet.SOLVERS, SOLVER by default) and "deadline" (seconds, DEADLINE by
+# default). The answer is {"status": "solved" | "no solution" | "timeout" | "error", "path": [...] (the moves of the solver,
+# null without a solution), "length", "reason" (why the board has no solution, see RicochetRobots.prove_unsolvable),
+# "stats" (SearchStats of the search) and "time" (seconds spent solving)}. GET /health gives the state of the service.
+#
+# The workers keep the boards they have seen (the stop table and the distance maps of a layout of walls are only computed
+# once per worker), the requests of the fast single-robot solvers are sent to the workers in batches, and a board that is
+# already being solved by the same solver is not solved again: the identical requests share the answer of the first one
+# (and its deadline). The answers are kept in a SolutionCache
+import argparse
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from urllib.request import Request, urlopen
+
+from Ricochet import (DIRECTIONS, SOLVERS, CancelToken, RicochetRobots, SearchCancelled, SearchStats, color_index,
+                      robot_color)
+from levels import COLOR_LETTERS, LETTER_COLORS, level_from_text
+from solution_cache import SolutionCache, board_fingerprint, canonical_robots, path_from_ranks, path_to_ranks
+
+PORT = 8765
+SOLVER = 'bfs'  # solver of the requests that do not give one
+DEADLINE = 10  # seconds given to a request that does not give a deadline...
+MAX_DEADLINE = 300  # ... and the longest deadline a request can ask for
+BATCH_SIZE = 16  # requests sent to a worker at once
+BATCH_WAIT = 0.002  # seconds the first request of a batch waits for the others
+BATCHED_SOLVERS = {'dfs', 'bfs', 'bidirectional_bfs', 'A_star', 'greedy_best_first_search'}  # the others go alone
+WORKER_LAYOUTS = 64  # layouts of walls kept by every worker
+
+worker_layouts = OrderedDict()  # layouts of walls already seen by this worker: (size, walls) -> RicochetRobots
+
+
+# color of a robot or of the target of a JSON board: a letter of COLOR_LETTERS or an index of robot_color
+def json_color(value):
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return robot_color(value)
+    if value in LETTER_COLORS:
+        return LETTER_COLORS[value]
+    raise ValueError("unknown color %r" % (value,))
+
+
+# cell (x, y) of a JSON board, checked against the size of the board
+def json_cell(value, size):
+    x, y = value
+    if not all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v < size for v in (x, y)):
+        raise ValueError("cell %r is not on a %dx%d board" % (value, size, size))
+    return x, y
+
+
+# RicochetRobots of a JSON board (see the top of the file). Raises ValueError for a board that is not valid
+def board_from_json(board):
+    if 'text' in board:
+        return level_from_text(board['text'])
+    size = board.get('size', 16)
+    if not isinstance(size, int) or not 2 <= size <= 256:
+        raise ValueError("the size of the board must be 2 to 256")
+    game = RicochetRobots(size)
+    game.add_walls([json_cell(cell, size) for cell in board.get('walls', [])])
+    edges = []
+    for x, y, direction in board.get('edges', []):
+        if direction not in DIRECTIONS:
+            raise ValueError("unknown direction %r" % (direction,))
+        edges.append(json_cell((x, y), size) + (direction,))
+    game.add_edge_walls(edges)
+    robots = [json_cell(robot[:2], size) + (json_color(robot[2]),) for robot in board['robots']]
+    if len({robot[:2] for robot in robots}) != len(robots) or any(robot[:2] in game.walls for robot in robots):
+        raise ValueError("two robots on the same cell or a robot on a wall")
+    game.place_robots(robots)
+    x, y, color = board['target']
+    game.place_target(json_cell((x, y), size), json_color(color))
+    return game
+
+
+# JSON board of game, for the front-ends that build their boards with RicochetRobots
+def board_to_json(game, solver=SOLVER, deadline=DEADLINE):
+    def color(value):
+        return COLOR_LETTERS.get(value, color_index(value))
+    return {
+        'size': game.size,
+        'walls': sorted(game.walls),
+        'edges': game.edge_walls(),
+        'robots': [[x, y, color(c)] for x, y, c in map(game.initial_positions.get, sorted(game.initial_positions))],
+        'target': list(game.target) + [color(game.target_color)],
+        'solver': solver,
+        'deadline': deadline,
+    }
+
+
+# send game to the solve server at url and return its answer (a dict, see the top of the file)
+def solve_remote(game, solver=SOLVER, deadline=DEADLINE, url='http://127.0.0.1:%d' % PORT):
+    body = json.dumps(board_to_json(game, solver, deadline)).encode()
+    request = Request(url + '/solve', body, {'Content-Type': 'application/json'})
+    with urlopen(request, timeout=deadline + 5) as response:
+        return json.loads(response.read())
+
+
+# runs once in every worker when it starts: NumPy (used by numpy_bfs) is imported before the first request needs it
+def warm_up_worker():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+
+
+# keeps a worker busy for a moment, so the pool starts all its workers at once (see SolveService)
+def start_worker():
+    time.sleep(0.1)
+    return os.getpid()
+
+
+# board of this worker for job, with the robots and the target of the job. The boards are kept by layout of walls, so the
+# stop table and the distance maps (which are kept by target and blockers) of a layout are reused by the next requests
+def worker_game(job):
+    key = (job['size'], job['cell_walls'])
+    game = worker_layouts.get(key)
+    if game is None:
+        game = RicochetRobots(job['size'])
+        game.set_cell_walls(job['cell_walls'])
+        game.build_stop_table()
+        game.verbose = False
+        worker_layouts[key] = game
+        if len(worker_layouts) > WORKER_LAYOUTS:
+            worker_layouts.popitem(last=False)
+    worker_layouts.move_to_end(key)
+    game.robots, game.colored_robots, game.initial_positions = {}, {}, {}
+    game.already_visited = [[]]
+    game.game_over = False
+    game.place_robots(job['robots'])
+    game.place_target(job['target'], job['target_color'])
+    return game
+
+
+# solve one job in a worker, within its deadline (a time.time(), which all the processes share)
+def solve_job(job):
+    game = worker_game(job)
+    start_time = time.perf_counter()
+    path, reason, status = None, game.prove_unsolvable(), 'no solution'
+    if reason is None and time.time() >= job['deadline']:
+        status = 'timeout'
+    elif reason is None:
+        game.cancel_token = CancelToken(time.monotonic() + job['deadline'] - time.time())
+        try:
+            path = getattr(game, job['solver'])()
+            status = 'no solution' if path is None else 'solved'
+        except SearchCancelled:
+            status = 'timeout'
+        except Exception as error:  # only this job fails, not the other jobs of its batch
+            return {'status': 'error', 'error': str(error), 'path': None, 'length': None, 'reason': None, 'stats': None,
+                    'time': time.perf_counter() - start_time}
+        finally:
+            game.cancel_token = None
+    return {
+        'status': status,
+        'path': path,
+        'length': None if path is None else len(path),
+        'reason': reason,
+        'stats': game.stats.as_dict() if reason is None else SearchStats().as_dict(),
+        'time': time.perf_counter() - start_time,
+    }
+
+
+# answer of a request whose robots are in the order of canonical_robots, from the answer shared by the identical requests
+# (its joint moves give the rank of the robot instead of its id, like in the SolutionCache)
+def answer_from_ranks(answer, order):
+    return dict(answer, path=path_from_ranks(answer['path'], order))
+
+
+def solve_jobs(jobs):
+    return [solve_job(job) for job in jobs]
+
+
+# the pool of workers behind the server. solve() can be called from many threads at once (one per HTTP request)
+class SolveService:
+    def __init__(self, workers=None, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, cache_path=None):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.cache = SolutionCache(cache_path)  # answers of the boards already solved (only the memory without a file)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up_worker)
+        # start every worker now instead of at the first requests
+        for future in [self.executor.submit(start_worker) for _ in range(self.workers)]:
+            future.result()
+        self.lock = threading.Condition()
+        self.pending = []  # (key, job, game) of the batched requests not sent to a worker yet
+        self.in_flight = {}  # key (board and solver) -> Future of its answer (see answer_from_ranks), shared by the identical requests
+        self.closed = False
+        self.batcher = threading.Thread(target=self.send_batches, daemon=True)
+        self.batcher.start()
+
+    # Future of the answer to request (a JSON board with its solver and deadline). Raises ValueError for a request that is
+    # not valid
+    def solve(self, request):
+        solver = request.get('solver', SOLVER)
+        if solver not in SOLVERS:
+            raise ValueError("unknown solver %r" % (solver,))
+        deadline = request.get('deadline', DEADLINE)
+        if not isinstance(deadline, (int, float)) or not 0 < deadline <= MAX_DEADLINE:
+            raise ValueError("the deadline must be 0 to %d seconds" % MAX_DEADLINE)
+        try:
+            game = board_from_json(request)
+        except (AttributeError, IndexError, KeyError, TypeError) as error:
+            raise ValueError("the board is not valid: %r" % (error,))
+        key = board_fingerprint(game, solver)
+        order = canonical_robots(game)
+        future = Future()
+
+        with self.lock:
+            shared = self.in_flight.get(key)
+            if shared is None:
+                found, path = self.cache.lookup(game, solver)
+                if found:
+                    future.set_result({'status': 'no solution' if path is None else 'solved', 'path': path,
+                                       'length': None if path is None else len(path), 'reason': None, 'stats': None,
+                                       'time': 0.0})
+                    return future
+                self.in_flight[key] = Future()
+            # the robots of an identical request can have other ids: the answer is given back with the ids of this one
+            shared_future = self.in_flight[key]
+        shared_future.add_done_callback(lambda shared: future.set_result(answer_from_ranks(shared.result(), order)))
+        if shared is not None:
+            return future
+        job = {
+            'size': game.size,
+            'cell_walls': bytes(game.cell_walls),
+            'robots': [game.initial_positions[robot_id] for robot_id in sorted(game.initial_positions)],
+            'target': game.target,
+            'target_color': game.target_color,
+            'solver': solver,
+            'deadline': time.time() + deadline,
+        }
+        if solver in BATCHED_SOLVERS:
+            with self.lock:
+                self.pending.append((key, job, game))
+                self.lock.notify()
+        else:
+            self.send([(key, job, game)])
+        return future
+
+    # batcher thread: waits for batched requests and sends them to the workers, batch_size at most at once. The first
+    # request of a batch waits at most batch_wait seconds for the next ones
+    def send_batches(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.lock.wait()
+                if self.closed:
+                    return
+                end = time.monotonic() + self.batch_wait
+                while len(self.pending) < self.batch_size and time.monotonic() < end:
+                    self.lock.wait(end - time.monotonic())
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            self.send(batch)
+
+    # send the jobs of a batch of (key, job, game) to a worker
+    def send(self, batch):
+        try:
+            chunk = self.executor.submit(solve_jobs, [job for _, job, _ in batch])
+        except RuntimeError as error:  # the pool is shut down
+            self.finish(batch, None, error)
+            return
+        chunk.add_done_callback(functools.partial(self.finish, batch))
+
+    # give every request of batch its answer, once the worker is done
+    def finish(self, batch, chunk, error=None):
+        answers = None
+        try:
+            answers = chunk.result() if error is None else None
+        except Exception as chunk_error:  # the worker died or a solver raised
+            error = chunk_error
+        if answers is None:
+            answers = [{'status': 'error', 'error': str(error), 'path': None, 'length': None, 'reason': None,
+                        'stats': None, 'time': None}] * len(batch)
+        with self.lock:
+            futures = [self.in_flight.pop(key) for key, _, _ in batch]
+        for (_, job, game), answer, future in zip(batch, answers, futures):
+            if answer['status'] in ('solved', 'no solution'):
+                self.cache.store(game, job['solver'], answer['path'])
+            future.set_result(dict(answer, path=path_to_ranks(answer['path'], canonical_robots(game))))
+
+    def health(self):
+        with self.lock:
+            return {'workers': self.workers, 'pending': len(self.pending), 'in_flight': len(self.in_flight)}
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify()
+        self.executor.shutdown(cancel_futures=True)
+
+
+class SolveHandler(BaseHTTPRequestHandler):
+    service = None  # the SolveService of the server
+
+    def send_json(self, code, answer):
+        body = json.dumps(answer).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': "unknown path %s" % self.path})
+            return
+        self.send_json(200, self.service.health())
+
+    def do_POST(self):
+        if self.path != '/solve':
+            self.send_json(404, {'error': "unknown path %s" % self.path})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if not isinstance(request, dict):
+                raise ValueError("the request must be a JSON object")
+            future = self.service.solve(request)
+        except ValueError as error:  # also the JSON decoding errors
+            self.send_json(400, {'error': str(error)})
+            return
+        # the worker stops the search at the deadline, the extra second is for a worker busy with the other jobs of its batch
+        try:
+            answer = future.result(timeout=request.get('deadline', DEADLINE) + 1)
+        except TimeoutError:
+            answer = {'status': 'timeout', 'path': None, 'length': None, 'reason': None, 'stats': None, 'time': None}
+        self.send_json(200, answer)
+
+    def log_message(self, format, *args):
+        pass  # no line per request
+
+
+class SolveServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # connections waiting to be accepted (5 by default), for many front-ends at once
+
+
+# HTTP server of a SolveService on host:port (localhost only by default)
+def make_server(service, host='127.0.0.1', port=PORT):
+    handler = type('Handler', (SolveHandler,), {'service': service})
+    return SolveServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve Ricochet Robots boards sent as JSON over HTTP on localhost")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--batch-wait', type=float, default=BATCH_WAIT, help="seconds a request waits for its batch")
+    parser.add_argument('--cache', help="sqlite file of the solution cache (only in memory without it)")
+    args = parser.parse_args()
+
+    service = SolveService(args.workers, args.batch_size, args.batch_wait, args.cache)
+    server = make_server(service, args.host, args.port)
+    print("Solving on http://%s:%d with %d workers" % (args.host, args.port, service.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
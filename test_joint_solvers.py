@@ -0,0 +1,48 @@
+# Cross-check of the joint solvers, which share the canonical states of RicochetRobots (canonical_move, canonical_path, ...):
+# on seeded small boards they must find solutions of the same length, and every solution must be legal
+# (run with python -m pytest test_joint_solvers.py)
+import unittest
+
+from Ricochet import RicochetRobots
+from test_solve_server import replays
+
+JOINT_SOLVERS = ['multi_robot_bfs', 'ida_star', 'external_bfs', 'numpy_bfs']
+SEEDS = range(40)
+
+
+# seeded random board: size 6 to 8, 3 or 4 robots, and walls between cells on half of them
+def small_board(seed):
+    game = RicochetRobots(6 + seed % 3, seed=seed, num_robots=3 + seed % 2)
+    game.verbose = False
+    game.place_walls_random()
+    if seed % 2:
+        rng = game.rng
+        game.add_edge_walls([(rng.randrange(game.size), rng.randrange(game.size), rng.choice(['down', 'right']))
+                             for _ in range(game.size)])
+    game.place_target_random()
+    game.place_robots_random()
+    return game
+
+
+class JointSolversTest(unittest.TestCase):
+    def test_same_lengths_and_legal_paths(self):
+        try:
+            import numpy  # noqa: F401
+            solvers = JOINT_SOLVERS
+        except ImportError:
+            solvers = JOINT_SOLVERS[:-1]
+        solved = 0
+        for seed in SEEDS:
+            lengths = {}
+            for solver in solvers:
+                path = getattr(small_board(seed), solver)()
+                lengths[solver] = None if path is None else len(path)
+                if path is not None:
+                    self.assertTrue(replays(small_board(seed), path), "%s on board %d: %r" % (solver, seed, path))
+            self.assertEqual(len(set(lengths.values())), 1, "board %d: %r" % (seed, lengths))
+            solved += lengths[solvers[0]] is not None
+        self.assertGreater(solved, len(SEEDS) // 2)  # most boards have a solution, so the paths are checked
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# prove_unsolvable must never reject a board that has a solution: on seeded boards, every board where a joint BFS (run
+# without prove_unsolvable) finds a solution must get None (run with python -m pytest test_prove_unsolvable.py)
+import unittest
+
+from Ricochet import RicochetRobots
+
+SEEDS = range(400)
+
+
+# seeded random board: size 5 to 7, 4 robots on the 5x5 boards and 2 or 3 on the others (the boards without solution are
+# searched to the end), and walls between cells on 3 boards out of 4
+def board(seed):
+    size = 5 + seed % 3
+    game = RicochetRobots(size, seed=seed, num_robots=4 if size == 5 else 2 + seed // 3 % 2)
+    game.verbose = False
+    rng = game.rng
+    game.place_walls_random()
+    if seed % 4:
+        game.add_edge_walls([(rng.randrange(size), rng.randrange(size), rng.choice(['down', 'right']))
+                             for _ in range(size * (seed % 4) // 2)])
+    game.place_target_random()
+    game.place_robots_random()
+    return game
+
+
+# solution of the joint BFS of multi_robot_bfs, without asking prove_unsolvable first
+def joint_bfs(game):
+    goal_ids = [robot_id for robot_id, (_, _, color) in game.initial_positions.items() if color == game.target_color]
+    return game.run_search(game.iter_packed_bfs(sorted(game.initial_positions), goal_ids))
+
+
+class ProveUnsolvableTest(unittest.TestCase):
+    def test_never_rejects_a_solvable_board(self):
+        solvable = rejected = 0
+        for seed in SEEDS:
+            game = board(seed)
+            reason = game.prove_unsolvable()
+            if joint_bfs(board(seed)) is not None:
+                solvable += 1
+                self.assertIsNone(reason, "board %d has a solution but was rejected: %s" % (seed, reason))
+            elif reason is not None:
+                rejected += 1
+        # the boards cover both cases, so the check is not empty
+        self.assertGreater(solvable, len(SEEDS) // 2)
+        self.assertGreater(rejected, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# Tests of the solve service of solve_server.py (run with python -m pytest test_solve_server.py)
+import unittest
+
+from Ricochet import RicochetRobots
+from batch import build_board
+from solve_server import SolveService, board_from_json, board_to_json, solve_jobs
+
+
+# the moves of path (robot_id, direction, new_pos) replayed on game: True if they are legal and end on the target
+def replays(game, path):
+    for robot_id, direction, position in path:
+        game.selected_robot = robot_id
+        game.move_robot(direction)
+        if game.robots[robot_id] != tuple(position):
+            return False
+    return game.game_over
+
+
+class SolveServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service = SolveService(workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+
+    def test_failing_solver(self):
+        # numpy_bfs packs the robots in 64 bits, which 8 robots on a 20x20 board do not fit in
+        seed = 0
+        while True:
+            game = RicochetRobots(20, seed=seed, num_robots=8)
+            game.place_walls_random()
+            game.place_target_random()
+            game.place_robots_random()
+            if game.prove_unsolvable() is None:
+                break
+            seed += 1
+        request = board_to_json(game, 'numpy_bfs', deadline=5)
+        for _ in range(2):  # the identical request after it is not given a dead answer
+            answer = self.service.solve(request).result(timeout=10)
+            self.assertEqual(answer['status'], 'error')
+            self.assertEqual(self.service.health()['in_flight'], 0)
+
+    def test_failing_job_of_batch(self):
+        jobs = []
+        for solver in ['no_such_solver', 'bfs']:
+            game = build_board(('level', 1))
+            jobs.append({'size': game.size, 'cell_walls': bytes(game.cell_walls), 'target': game.target,
+                         'robots': [game.initial_positions[robot_id] for robot_id in sorted(game.initial_positions)],
+                         'target_color': game.target_color, 'solver': solver, 'deadline': float('inf')})
+        answers = solve_jobs(jobs)
+        self.assertEqual([answer['status'] for answer in answers], ['error', 'solved'])
+
+    def test_identical_requests_with_other_robot_ids(self):
+        game = build_board(('level', 2))
+        request = board_to_json(game, 'multi_robot_bfs', deadline=60)
+        reversed_request = dict(request, robots=request['robots'][::-1])
+        futures = [self.service.solve(request), self.service.solve(reversed_request)]
+        for board, future in zip([request, reversed_request], futures):
+            answer = future.result(timeout=70)
+            self.assertEqual(answer['status'], 'solved')
+            self.assertTrue(replays(board_from_json(board), answer['path']))
+
+
+if __name__ == '__main__':
+    unittest.main()